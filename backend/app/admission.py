@@ -0,0 +1,182 @@
+"""Kontrola dopuszczania żądań (load shedding) i limity per użytkownik.
+
+Przy skoku ruchu żądania nie czekają bez końca w threadpoolu i w kolejce
+puli połączeń: każda grupa tras (prefiks ścieżki) ma limit równoległych
+żądań i ograniczoną kolejkę oczekujących. Pełna kolejka albo zbyt długie
+czekanie (ADMISSION_QUEUE_TIMEOUT) kończą się od razu odpowiedzią 503 z
+Retry-After - zanim żądanie zdąży zweryfikować token czy dotknąć bazy/S3.
+
+    ADMISSION_TODOS_CONCURRENCY / ADMISSION_TODOS_QUEUE  - /api/todos
+    ADMISSION_FILES_CONCURRENCY / ADMISSION_FILES_QUEUE  - /api/files
+    (0 = bez limitu dla grupy)
+
+Opcjonalnie (RATE_LIMIT_PER_USER > 0) token bucket per `sub` z JWT -
+przekroczenie to 429 z Retry-After. Limity i kubełki są per proces
+(worker gunicorna), więc przy WEB_CONCURRENCY=N sumaryczny limit jest N razy większy.
+"""
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .auth import get_current_user
+
+# Prefiks ścieżki -> grupa (domyślny limit równoległych żądań, domyślna długość kolejki)
+_GROUPS = {
+    "/api/todos": ("todos", 64, 256),
+    "/api/files": ("files", 32, 128),
+}
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+RATE_LIMIT_PER_USER = float(os.getenv("RATE_LIMIT_PER_USER", "0"))  # żądań/s, 0 = wyłączone
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+_RATE_LIMIT_USERS = 10000
+
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests admitted and running", ["group"],
+                            multiprocess_mode="livesum")
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for a slot", ["group"],
+                              multiprocess_mode="livesum")
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds", "Time spent queued before admission", ["group"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+ADMISSION_REJECTIONS = Counter("admission_rejections_total", "Shed requests", ["group", "reason"])
+
+
+class ConcurrencyLimit:
+    """Do `limit` równoległych żądań; kolejne (maks. `queue`) czekają FIFO do `timeout` s."""
+
+    def __init__(self, group: str, limit: int, queue: int, timeout: float):
+        self.group = group
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self._waiting = 0
+        self._in_flight = ADMISSION_IN_FLIGHT.labels(group)
+        self._depth = ADMISSION_QUEUE_DEPTH.labels(group)
+
+    def _reject(self, reason: str) -> bool:
+        ADMISSION_REJECTIONS.labels(self.group, reason).inc()
+        return False
+
+    async def acquire(self) -> bool:
+        if self._semaphore.locked():
+            if self._waiting >= self.queue:
+                return self._reject("queue_full")
+            self._waiting += 1
+            self._depth.inc()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return self._reject("queue_timeout")
+            finally:
+                self._waiting -= 1
+                self._depth.dec()
+                ADMISSION_WAIT_SECONDS.labels(self.group).observe(time.perf_counter() - started)
+        else:
+            # Wolny slot - acquire nie zawiesza korutyny
+            await self._semaphore.acquire()
+        self._in_flight.inc()
+        return True
+
+    def release(self) -> None:
+        self._in_flight.dec()
+        self._semaphore.release()
+
+
+def _configured_limits() -> Dict[str, ConcurrencyLimit]:
+    limits = {}
+    for prefix, (group, concurrency, queue) in _GROUPS.items():
+        name = group.upper()
+        concurrency = int(os.getenv(f"ADMISSION_{name}_CONCURRENCY", str(concurrency)))
+        queue = int(os.getenv(f"ADMISSION_{name}_QUEUE", str(queue)))
+        if concurrency > 0:
+            limits[prefix] = ConcurrencyLimit(group, concurrency, queue, ADMISSION_QUEUE_TIMEOUT)
+    return limits
+
+
+class AdmissionMiddleware:
+    """ASGI middleware przed trasami z `_GROUPS`; /, /ready i /metrics nie są limitowane.
+
+    Slot jest trzymany do wysłania całej odpowiedzi (także strumieniowanej).
+    """
+
+    def __init__(self, app: ASGIApp, limits: Optional[Dict[str, ConcurrencyLimit]] = None):
+        self.app = app
+        self.limits = _configured_limits() if limits is None else limits
+
+    def _match(self, path: str) -> Optional[ConcurrencyLimit]:
+        for prefix, limit in self.limits.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                return limit
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self._match(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limit.acquire():
+            response = JSONResponse(
+                {"detail": "Server overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+
+class TokenBucket:
+    """Token bucket per klucz: `rate` żetonów/s, maks. `burst`; najdawniej używane klucze są usuwane."""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = _RATE_LIMIT_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        """Zużywa żeton i zwraca 0 albo liczbę sekund do pojawienia się następnego."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+user_rate_limit = TokenBucket(RATE_LIMIT_PER_USER, RATE_LIMIT_BURST) if RATE_LIMIT_PER_USER > 0 else None
+
+
+async def rate_limit(current_user=Depends(get_current_user)) -> None:
+    """Zależność tras uwierzytelnionych: 429, gdy użytkownik wyczerpał swój kubełek."""
+    if user_rate_limit is None:
+        return
+    wait = user_rate_limit.take(current_user["sub"])
+    if wait:
+        ADMISSION_REJECTIONS.labels("user", "rate_limit").inc()
+        raise HTTPException(429, "Rate limit exceeded", headers={"Retry-After": str(math.ceil(wait))})
@@ -1,5 +1,10 @@
 import os
 import time
+import asyncio
+import logging
+import hashlib
+import threading
+from collections import OrderedDict
 import requests
 import urllib3
 from jose import jwk, jwt
@@ -7,11 +12,15 @@ from jose.exceptions import JWTError
 from jose.utils import base64url_decode
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from prometheus_client import Counter, Histogram
+from typing import Any, Dict, Optional, Tuple
 
 # Wyłącz ostrzeżenia o niezweryfikowanym SSL (dla self-signed certs)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
 # OIDC / Keycloak
@@ -27,6 +36,40 @@ if not OIDC_JWKS_URL and OIDC_ISSUER_URL:
 jwks_cache: Optional[Dict] = None
 jwks_cache_time: float = 0
 JWKS_CACHE_DURATION = 3600
+JWKS_REFRESH_MARGIN = int(os.getenv("JWKS_REFRESH_MARGIN", "300"))  # odświeżenie w tle przed wygaśnięciem
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))  # limit wymuszonych odświeżeń (nieznany kid)
+JWKS_MAX_STALE = int(os.getenv("JWKS_MAX_STALE", "86400"))  # jak długo serwować stary JWKS przy awarii Keycloak
+_last_forced_refresh: float = 0
+
+# Cache zweryfikowanych tokenów (klucz: sha256 tokenu, wpis ważny do `exp`)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+_token_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Zbudowane klucze publiczne per `kid` (czyszczone przy odświeżeniu JWKS)
+_public_keys: Dict[str, Any] = {}
+
+TOKEN_CACHE_HITS = Counter("auth_token_cache_hits_total", "Verified-token cache hits")
+TOKEN_CACHE_MISSES = Counter("auth_token_cache_misses_total", "Verified-token cache misses")
+PUBLIC_KEY_CACHE_HITS = Counter("auth_public_key_cache_hits_total", "Public key cache hits")
+PUBLIC_KEY_CACHE_MISSES = Counter("auth_public_key_cache_misses_total", "Public key cache misses")
+VERIFY_SECONDS = Histogram(
+    "auth_verify_token_seconds", "Token verification time (including JWKS waits)", ["result"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10),
+)
+VERIFY_FAILURES = Counter("auth_verify_token_failures_total", "Rejected tokens", ["reason"])
+JWKS_FETCH_SECONDS = Histogram("auth_jwks_fetch_seconds", "JWKS HTTP fetch latency")
+JWKS_REFRESHES = Counter("auth_jwks_refresh_total", "JWKS fetches", ["result"])
+
+# HTTPException.detail -> etykieta `reason` (bez treści wyjątku - ograniczona kardynalność)
+_FAILURE_REASONS = {
+    "Invalid token header (missing kid)": "missing_kid",
+    "Public key not found in JWKs": "unknown_kid",
+    "Invalid token signature": "bad_signature",
+    "Token has expired": "expired",
+    "Invalid token issuer": "bad_issuer",
+    "Invalid token audience": "bad_audience",
+}
 
 
 def _require(value: Optional[str], name: str) -> str:
@@ -35,21 +78,125 @@ def _require(value: Optional[str], name: str) -> str:
     return value
 
 
-def get_jwks(force_refresh: bool = False) -> Dict:
+def _fetch_jwks() -> Dict:
     global jwks_cache, jwks_cache_time
 
+    jwks_url = _require(OIDC_JWKS_URL, "OIDC_JWKS_URL (or set OIDC_ISSUER_URL)")
+    try:
+        with JWKS_FETCH_SECONDS.time():
+            response = requests.get(jwks_url, timeout=10, verify=SSL_VERIFY)
+            response.raise_for_status()
+    except requests.RequestException:
+        JWKS_REFRESHES.labels("error").inc()
+        raise
+    JWKS_REFRESHES.labels("ok").inc()
+
+    jwks_cache = response.json()
+    jwks_cache_time = time.time()
+    _public_keys.clear()
+    return jwks_cache
+
+
+def _serve_stale(error: Exception) -> Dict:
+    """Zwraca ostatni poprawny JWKS, gdy Keycloak jest chwilowo niedostępny."""
+    if jwks_cache and (time.time() - jwks_cache_time) < JWKS_MAX_STALE:
+        logger.warning("JWKS refresh failed, serving cached key set: %s", error)
+        return jwks_cache
+    raise error
+
+
+def _forced_refresh_allowed() -> bool:
+    global _last_forced_refresh
+
+    current_time = time.time()
+    if (current_time - _last_forced_refresh) < JWKS_MIN_REFRESH_INTERVAL:
+        return False
+    _last_forced_refresh = current_time
+    return True
+
+
+def get_jwks(force_refresh: bool = False) -> Dict:
     current_time = time.time()
 
+    if force_refresh and jwks_cache and not _forced_refresh_allowed():
+        return jwks_cache
+
     if not force_refresh and jwks_cache and (current_time - jwks_cache_time) < JWKS_CACHE_DURATION:
         return jwks_cache
 
-    jwks_url = _require(OIDC_JWKS_URL, "OIDC_JWKS_URL (or set OIDC_ISSUER_URL)")
-    response = requests.get(jwks_url, timeout=10, verify=SSL_VERIFY)
-    response.raise_for_status()
+    try:
+        return _fetch_jwks()
+    except requests.RequestException as e:
+        return _serve_stale(e)
 
-    jwks_cache = response.json()
-    jwks_cache_time = current_time
-    return jwks_cache
+
+class JWKSProvider:
+    """Asynchroniczny dostawca JWKS dla `get_current_user`.
+
+    Pobieranie odbywa się w threadpoolu (nie blokuje event loopa), równoległe
+    odświeżenia są łączone w jedno żądanie (single-flight), a cache jest
+    odświeżany w tle `JWKS_REFRESH_MARGIN` sekund przed wygaśnięciem.
+    Gdy Keycloak nie odpowiada, serwowany jest ostatni poprawny JWKS
+    (maksymalnie `JWKS_MAX_STALE` sekund).
+    """
+
+    def __init__(self):
+        self._refresh_task: Optional[asyncio.Future] = None
+        self._last_failure: float = 0
+
+    async def get(self, force_refresh: bool = False) -> Dict:
+        if not jwks_cache:
+            return await self._refresh()
+
+        if force_refresh:
+            if not _forced_refresh_allowed():
+                return jwks_cache
+            try:
+                return await self._refresh()
+            except requests.RequestException as e:
+                return _serve_stale(e)
+
+        age = time.time() - jwks_cache_time
+        if age >= JWKS_MAX_STALE:
+            return await self._refresh()
+        if age >= JWKS_CACHE_DURATION - JWKS_REFRESH_MARGIN:
+            self._start_refresh()
+        return jwks_cache
+
+    async def warm(self) -> None:
+        """Pobiera JWKS i buduje klucze publiczne przed pierwszym żądaniem (readiness)."""
+        if not OIDC_JWKS_URL:
+            return
+        jwks = await self.get()
+        for key in jwks.get("keys", []):
+            if key.get("kid") and key.get("use", "sig") == "sig":
+                _get_public_key(key["kid"], key)
+
+    def _start_refresh(self, wait: bool = False) -> Optional[asyncio.Future]:
+        task = self._refresh_task
+        if task is not None and not task.done():
+            return task
+        if not wait and (time.time() - self._last_failure) < JWKS_MIN_REFRESH_INTERVAL:
+            return None
+
+        task = asyncio.ensure_future(run_in_threadpool(_fetch_jwks))
+        task.add_done_callback(self._on_refresh_done)
+        self._refresh_task = task
+        return task
+
+    def _on_refresh_done(self, task: asyncio.Future) -> None:
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self._last_failure = time.time()
+            logger.warning("JWKS refresh failed: %s", error)
+
+    async def _refresh(self) -> Dict:
+        return await asyncio.shield(self._start_refresh(wait=True))
+
+
+jwks_provider = JWKSProvider()
 
 
 def _select_key(jwks: Dict, kid: str) -> Optional[Dict]:
@@ -59,86 +206,194 @@ def _select_key(jwks: Dict, kid: str) -> Optional[Dict]:
     return None
 
 
+def _get_public_key(kid: str, key: Dict):
+    public_key = _public_keys.get(kid)
+    if public_key is None:
+        PUBLIC_KEY_CACHE_MISSES.inc()
+        public_key = jwk.construct(key)
+        _public_keys[kid] = public_key
+    else:
+        PUBLIC_KEY_CACHE_HITS.inc()
+    return public_key
+
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cached_claims(digest: str) -> Optional[Dict]:
+    with _token_cache_lock:
+        entry = _token_cache.get(digest)
+        if entry is None:
+            return None
+        exp, claims = entry
+        if time.time() > exp:
+            del _token_cache[digest]
+            return None
+        _token_cache.move_to_end(digest)
+        return claims
+
+
+def _cache_claims(digest: str, claims: Dict) -> None:
+    if TOKEN_CACHE_SIZE <= 0:
+        return
+    with _token_cache_lock:
+        _token_cache[digest] = (float(claims["exp"]), claims)
+        _token_cache.move_to_end(digest)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _unverified_kid(token: str) -> str:
+    headers = jwt.get_unverified_headers(token)
+    kid = headers.get("kid")
+    if not kid:
+        raise HTTPException(status_code=401, detail="Invalid token header (missing kid)")
+    return kid
+
+
+def _validate(token: str, kid: str, key: Optional[Dict]) -> Dict:
+    issuer = _require(OIDC_ISSUER_URL, "OIDC_ISSUER_URL")
+
+    if not key:
+        raise HTTPException(status_code=401, detail="Public key not found in JWKs")
+
+    public_key = _get_public_key(kid, key)
+    message, encoded_signature = token.rsplit('.', 1)
+    decoded_signature = base64url_decode(encoded_signature.encode())
+
+    if not public_key.verify(message.encode(), decoded_signature):
+        raise HTTPException(status_code=401, detail="Invalid token signature")
+
+    claims = jwt.get_unverified_claims(token)
+
+    # exp
+    exp = claims.get("exp")
+    if not exp or time.time() > exp:
+        raise HTTPException(status_code=401, detail="Token has expired")
+
+    # iss - akceptuj wewnętrzny lub zewnętrzny issuer
+    token_issuer = claims.get("iss")
+    valid_issuers = [issuer]
+    if OIDC_ISSUER_URL_EXTERNAL:
+        valid_issuers.append(OIDC_ISSUER_URL_EXTERNAL)
+
+    if token_issuer not in valid_issuers:
+        raise HTTPException(status_code=401, detail="Invalid token issuer")
+
+    # aud / azp
+    if OIDC_AUDIENCE:
+        aud = claims.get("aud")
+        azp = claims.get("azp")
+        aud_ok = False
+        if isinstance(aud, str):
+            aud_ok = (aud == OIDC_AUDIENCE)
+        elif isinstance(aud, list):
+            aud_ok = (OIDC_AUDIENCE in aud)
+
+        # fallback na azp (często przy SPA)
+        if not aud_ok and azp:
+            aud_ok = (azp == OIDC_AUDIENCE)
+
+        if not aud_ok:
+            raise HTTPException(status_code=401, detail="Invalid token audience")
+
+    return claims
+
+
+def _failure_reason(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return _FAILURE_REASONS.get(e.detail, "other")
+    if isinstance(e, requests.RequestException):
+        return "jwks_unavailable"
+    if isinstance(e, JWTError):
+        return "malformed"
+    return "other"
+
+
+def _record_failure(e: Exception, started: float) -> None:
+    VERIFY_FAILURES.labels(_failure_reason(e)).inc()
+    VERIFY_SECONDS.labels("failed").observe(time.perf_counter() - started)
+
+
+def _auth_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, requests.RequestException):
+        return HTTPException(status_code=503, detail=f"OIDC JWKS unavailable: {str(e)}")
+    if isinstance(e, JWTError):
+        return HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    return HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
+
+
 def verify_token(token: str) -> Dict:
     """Weryfikuje JWT (access token) wydany przez Keycloak/OIDC.
 
     Akceptuje warianty aud w Keycloak:
     - Standardowe `aud`
     - Lub `azp` (authorized party) przy tokenach, gdzie aud nie zawiera client_id.
-    """
-    try:
-        issuer = _require(OIDC_ISSUER_URL, "OIDC_ISSUER_URL")
 
-        headers = jwt.get_unverified_headers(token)
-        kid = headers.get("kid")
-        if not kid:
-            raise HTTPException(status_code=401, detail="Invalid token header (missing kid)")
+    Zweryfikowane claimy trafiają do cache LRU (do czasu `exp` tokenu),
+    więc kolejne żądania z tym samym tokenem pomijają weryfikację RSA.
+    """
+    started = time.perf_counter()
+    digest = _token_digest(token)
+    cached = _cached_claims(digest)
+    if cached is not None:
+        TOKEN_CACHE_HITS.inc()
+        VERIFY_SECONDS.labels("cached").observe(time.perf_counter() - started)
+        return cached
+    TOKEN_CACHE_MISSES.inc()
 
-        jwks = get_jwks()
-        key = _select_key(jwks, kid)
+    try:
+        kid = _unverified_kid(token)
+        key = _select_key(get_jwks(), kid)
 
         # Obsłuż rotację kluczy: odśwież cache i spróbuj raz jeszcze
         if not key:
-            jwks = get_jwks(force_refresh=True)
-            key = _select_key(jwks, kid)
-
-        if not key:
-            raise HTTPException(status_code=401, detail="Public key not found in JWKs")
-
-        public_key = jwk.construct(key)
-        message, encoded_signature = token.rsplit('.', 1)
-        decoded_signature = base64url_decode(encoded_signature.encode())
+            key = _select_key(get_jwks(force_refresh=True), kid)
 
-        if not public_key.verify(message.encode(), decoded_signature):
-            raise HTTPException(status_code=401, detail="Invalid token signature")
-
-        claims = jwt.get_unverified_claims(token)
-
-        # exp
-        exp = claims.get("exp")
-        if not exp or time.time() > exp:
-            raise HTTPException(status_code=401, detail="Token has expired")
-
-        # iss - akceptuj wewnętrzny lub zewnętrzny issuer
-        token_issuer = claims.get("iss")
-        valid_issuers = [issuer]
-        if OIDC_ISSUER_URL_EXTERNAL:
-            valid_issuers.append(OIDC_ISSUER_URL_EXTERNAL)
+        claims = _validate(token, kid, key)
+    except Exception as e:
+        _record_failure(e, started)
+        raise _auth_error(e)
 
-        if token_issuer not in valid_issuers:
-            raise HTTPException(status_code=401, detail="Invalid token issuer")
+    _cache_claims(digest, claims)
+    VERIFY_SECONDS.labels("verified").observe(time.perf_counter() - started)
+    return claims
 
-        # aud / azp
-        if OIDC_AUDIENCE:
-            aud = claims.get("aud")
-            azp = claims.get("azp")
-            aud_ok = False
-            if isinstance(aud, str):
-                aud_ok = (aud == OIDC_AUDIENCE)
-            elif isinstance(aud, list):
-                aud_ok = (OIDC_AUDIENCE in aud)
 
-            # fallback na azp (często przy SPA)
-            if not aud_ok and azp:
-                aud_ok = (azp == OIDC_AUDIENCE)
+async def verify_token_async(token: str) -> Dict:
+    """Wariant `verify_token` dla event loopa - JWKS pobiera `jwks_provider`."""
+    started = time.perf_counter()
+    digest = _token_digest(token)
+    cached = _cached_claims(digest)
+    if cached is not None:
+        TOKEN_CACHE_HITS.inc()
+        VERIFY_SECONDS.labels("cached").observe(time.perf_counter() - started)
+        return cached
+    TOKEN_CACHE_MISSES.inc()
 
-            if not aud_ok:
-                raise HTTPException(status_code=401, detail="Invalid token audience")
+    try:
+        kid = _unverified_kid(token)
+        key = _select_key(await jwks_provider.get(), kid)
 
-        return claims
+        # Obsłuż rotację kluczy (wymuszone odświeżenie jest limitowane)
+        if not key:
+            key = _select_key(await jwks_provider.get(force_refresh=True), kid)
 
-    except requests.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"OIDC JWKS unavailable: {str(e)}")
-    except JWTError as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
-    except HTTPException:
-        raise
+        claims = _validate(token, kid, key)
     except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
+        _record_failure(e, started)
+        raise _auth_error(e)
+
+    _cache_claims(digest, claims)
+    VERIFY_SECONDS.labels("verified").observe(time.perf_counter() - started)
+    return claims
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Security(security),
 ) -> Dict:
     token = credentials.credentials
-    return verify_token(token)
\ No newline at end of file
+    return await verify_token_async(token)
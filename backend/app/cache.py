@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+import itertools
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+CACHE_REQUESTS = Counter("app_cache_requests_total", "Cache lookups", ["cache", "result"])
+CACHE_EVICTIONS = Counter("app_cache_evictions_total", "Cache evictions", ["cache", "reason"])
+CACHE_ENTRIES = Gauge("app_cache_entries", "Entries currently cached", ["cache"], multiprocess_mode="livesum")
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Minimalny interfejs cache - do zaimplementowania np. przez Redis/Memcached."""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        pass
+
+
+class NullCache(CacheBackend):
+    def get(self, key: Hashable) -> Optional[Any]:
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        pass
+
+    def delete(self, key: Hashable) -> None:
+        pass
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU z limitem liczby wpisów i TTL."""
+
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._entries = CACHE_ENTRIES.labels(name)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._data[key]
+                CACHE_EVICTIONS.labels(self.name, "ttl").inc()
+                self._entries.set(len(self._data))
+                entry = None
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.labels(self.name, "size").inc()
+            self._entries.set(len(self._data))
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                CACHE_EVICTIONS.labels(self.name, "invalidate").inc()
+            self._entries.set(len(self._data))
+
+
+# Generacje list: unikalne w procesie, więc wpis zapisany pod starą generacją
+# nie może "wrócić" nawet po wyrzuceniu klucza generacji z LRU.
+_generations = itertools.count(1)
+
+
+class TodoCache:
+    """Read-through cache odczytów todo per użytkownik.
+
+    Klucze list i pojedynczych todo zawierają generację użytkownika, a każdy
+    zapis ją podbija. Odczyt pobiera klucz (i generację) przed zapytaniem, więc
+    wynik sprzed równoległego zapisu trafia pod starą generację i nigdy nie
+    zostanie zwrócony - także gdy `set` nastąpi już po unieważnieniu.
+    """
+
+    def __init__(self, backend: CacheBackend, name: str = "todos"):
+        self.backend = backend
+        self._hits = CACHE_REQUESTS.labels(name, "hit")
+        self._misses = CACHE_REQUESTS.labels(name, "miss")
+
+    def _generation(self, user_id: str) -> int:
+        generation = self.backend.get(("gen", user_id))
+        if generation is None:
+            generation = next(_generations)
+            self.backend.set(("gen", user_id), generation)
+        return generation
+
+    def list_key(self, user_id: str, params: Hashable) -> Tuple:
+        return ("list", user_id, self._generation(user_id), params)
+
+    def item_key(self, user_id: str, todo_id: int) -> Tuple:
+        return ("item", user_id, self._generation(user_id), todo_id)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        value = self.backend.get(key)
+        (self._misses if value is None else self._hits).inc()
+        return value
+
+    def set(self, key: Tuple, value: Any) -> None:
+        self.backend.set(key, value)
+
+    def invalidate(self, user_id: str, todo_ids=()) -> None:
+        previous = self.backend.get(("gen", user_id))
+        self.backend.set(("gen", user_id), next(_generations))
+        # Wpisy starej generacji są już nieosiągalne - usuwane tylko, żeby zwolnić miejsce
+        if previous is not None:
+            for todo_id in todo_ids:
+                self.backend.delete(("item", user_id, previous, todo_id))
+
+
+def _build_backend() -> CacheBackend:
+    # Unieważnienie działa tylko w obrębie procesu: przy kilku workerach zapis
+    # w jednym nie czyści cache pozostałych, więc domyślnie cache jest wyłączony
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    kind = os.getenv("TODO_CACHE_BACKEND", "memory" if workers == 1 else "none").lower()
+    if kind == "none":
+        return NullCache()
+    if kind == "memory":
+        if workers > 1:
+            logger.warning("TODO_CACHE_BACKEND=memory with %d workers: reads may be stale for up to "
+                           "TODO_CACHE_TTL seconds after a write handled by another worker", workers)
+        return LRUCache(
+            "todos",
+            max_entries=int(os.getenv("TODO_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("TODO_CACHE_TTL", "30")),
+        )
+    raise RuntimeError(f"Unknown TODO_CACHE_BACKEND: {kind}")
+
+
+todo_cache = TodoCache(_build_backend())
@@ -0,0 +1,120 @@
+"""Routing odczytów na replikę z gwarancją read-your-writes.
+
+Zapisy idą zawsze na primary (`get_write_db`). Odczyty (`get_read_db`) idą na
+replikę (DATABASE_READ_URL), chyba że użytkownik modyfikował dane w ciągu
+ostatnich DB_READ_YOUR_WRITES_WINDOW sekund - wtedy też na primary, żeby nie
+zobaczył stanu sprzed własnego zapisu (opóźnienie replikacji).
+
+"Niedawny zapis" jest rozpoznawany na dwa sposoby:
+- nagłówek X-Primary-Until (unix ts) ustawiany w odpowiedzi na zapis, który
+  frontend odsyła w kolejnych żądaniach - działa przy wielu workerach i podach,
+- lokalna pamięć ostatnich zapisów per użytkownik w tym procesie - dla klientów,
+  którzy nagłówka nie odsyłają.
+
+Wersja sync (X-Sync-Token, ETag listy, /changes) jest zawsze czytana z primary
+(`get_primary_db`): token klienta może pochodzić z zapisu, którego replika
+jeszcze nie ma. Dane idą z repliki tylko wtedy, gdy dogoniła tę wersję.
+
+Bez DATABASE_READ_URL obie sesje korzystają z tej samej puli (primary).
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from fastapi import Depends, Request, Response
+from prometheus_client import Counter
+
+from .auth import get_current_user
+from .database import DATABASE_READ_URL, SessionLocal, ReadSessionLocal, AsyncSessionLocal, AsyncReadSessionLocal
+
+PRIMARY_UNTIL_HEADER = "X-Primary-Until"
+READ_YOUR_WRITES_WINDOW = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", "5"))
+_RECENT_WRITERS_SIZE = 10000
+
+DB_READ_ROUTING = Counter("db_read_routing_total", "Read-only requests by target pool", ["target"])
+
+_recent_writers: "OrderedDict[str, float]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def mark_write(user_id: str, response: Response) -> None:
+    until = time.time() + READ_YOUR_WRITES_WINDOW
+    with _lock:
+        _recent_writers[user_id] = until
+        _recent_writers.move_to_end(user_id)
+        while len(_recent_writers) > _RECENT_WRITERS_SIZE:
+            _recent_writers.popitem(last=False)
+    response.headers[PRIMARY_UNTIL_HEADER] = f"{until:.3f}"
+
+
+def _wrote_recently(user_id: str, request: Request) -> bool:
+    now = time.time()
+    try:
+        # Przycięte do okna - klient nie może trwale przypiąć się do primary
+        if now < float(request.headers.get(PRIMARY_UNTIL_HEADER, 0)) <= now + READ_YOUR_WRITES_WINDOW:
+            return True
+    except ValueError:
+        pass
+    with _lock:
+        return _recent_writers.get(user_id, 0) > now
+
+
+def _use_replica(request: Request, current_user) -> bool:
+    if not DATABASE_READ_URL:
+        return False
+    replica = not _wrote_recently(current_user["sub"], request)
+    DB_READ_ROUTING.labels("replica" if replica else "primary").inc()
+    return replica
+
+
+# Zależności - get_current_user jest cache'owane przez FastAPI w obrębie żądania
+
+def get_read_db(request: Request, current_user=Depends(get_current_user)):
+    db = (ReadSessionLocal if _use_replica(request, current_user) else SessionLocal)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_primary_db():
+    """Sesja na primary bez oznaczania zapisu; None, gdy nie ma repliki (odczyt i tak idzie na primary)."""
+    if not DATABASE_READ_URL:
+        yield None
+        return
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_write_db(response: Response, current_user=Depends(get_current_user)):
+    # Ustawiane przed zapisem: nieudana mutacja najwyżej skieruje kilka odczytów na primary
+    mark_write(current_user["sub"], response)
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request, current_user=Depends(get_current_user)):
+    factory = AsyncReadSessionLocal if _use_replica(request, current_user) else AsyncSessionLocal
+    async with factory() as db:
+        yield db
+
+
+async def get_async_primary_db():
+    if not DATABASE_READ_URL:
+        yield None
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_write_db(response: Response, current_user=Depends(get_current_user)):
+    mark_write(current_user["sub"], response)
+    async with AsyncSessionLocal() as db:
+        yield db
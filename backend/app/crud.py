@@ -1,32 +1,245 @@
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import select, insert, update, delete, case, func, literal_column, Row
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from .models import Todo
-from .schemas import TodoCreate
+from .models import Todo, TodoSyncState, TodoTombstone, SEARCH_DOCUMENT, SEARCH_TS_CONFIG
+from .cache import todo_cache
+from .schemas import TodoCreate, TodoListParams, TodoSearchParams, SYNC_MAX_CHANGES, encode_cursor, decode_cursor
 
-def create_todo(db: Session, data: TodoCreate, user_id: str) -> Todo:
-    obj = Todo(
+# Zapytania budowane raz i współdzielone z crud_async.py
+
+# Kolumny TodoOut: projekcja odczytów i RETURNING (zapis + odczyt w jednym round-tripie)
+_OUT_COLUMNS = (Todo.id, Todo.title, Todo.description, Todo.due_date, Todo.completed, Todo.image_key, Todo.version)
+
+# Każdy zapis najpierw podbija licznik użytkownika (upsert z RETURNING) i stempluje
+# nim zmienione wiersze; usunięcia zostawiają nagrobki z tą samą wersją.
+
+def _bump_version_stmt(dialect: str, user_id: str):
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(TodoSyncState)
+    return (
+        stmt.values(user_id=user_id, version=1)
+        .on_conflict_do_update(index_elements=[TodoSyncState.user_id], set_={"version": TodoSyncState.version + 1})
+        .returning(TodoSyncState.version)
+    )
+
+def _sync_state_stmt(user_id: str):
+    return select(TodoSyncState.version, TodoSyncState.pruned_version).where(TodoSyncState.user_id == user_id)
+
+def _tombstones_stmt(todo_ids: Sequence[int], user_id: str, version: int):
+    return insert(TodoTombstone).values([dict(user_id=user_id, todo_id=i, version=version) for i in todo_ids])
+
+def _changed_stmt(user_id: str, since: int):
+    # +1 wiersz, żeby wykryć przekroczenie limitu
+    return (
+        select(*_OUT_COLUMNS)
+        .where(Todo.user_id == user_id, Todo.version > since)
+        .order_by(Todo.version)
+        .limit(SYNC_MAX_CHANGES + 1)
+    )
+
+def _deleted_stmt(user_id: str, since: int):
+    return (
+        select(TodoTombstone.todo_id)
+        .where(TodoTombstone.user_id == user_id, TodoTombstone.version > since)
+        .order_by(TodoTombstone.version)
+        .limit(SYNC_MAX_CHANGES + 1)
+    )
+
+def _todo_values(data: TodoCreate, user_id: str, version: int) -> dict:
+    return dict(
         title=data.title,
         description=data.description,
         due_date=data.due_date,
         image_key=data.image_key,
         completed=False,
         user_id=user_id,
+        version=version,
     )
-    db.add(obj)
+
+def _insert_stmt(items: Sequence[TodoCreate], user_id: str, version: int):
+    return insert(Todo).values([_todo_values(d, user_id, version) for d in items]).returning(*_OUT_COLUMNS)
+
+def _set_completed_stmt(todo_ids: Sequence[int], completed: bool, user_id: str, version: int):
+    return (
+        update(Todo)
+        .where(Todo.id.in_(todo_ids), Todo.user_id == user_id)
+        .values(completed=completed, version=version)
+        .returning(*_OUT_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+def _delete_stmt(todo_ids: Sequence[int], user_id: str):
+    return (
+        delete(Todo)
+        .where(Todo.id.in_(todo_ids), Todo.user_id == user_id)
+        .returning(*_OUT_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+
+def _list_stmt(user_id: str, params: Optional[TodoListParams] = None):
+    stmt = select(*_OUT_COLUMNS).where(Todo.user_id == user_id)
+    if params is not None:
+        if params.cursor:
+            stmt = stmt.where(Todo.id < decode_cursor(params.cursor))
+        if params.completed is not None:
+            stmt = stmt.where(Todo.completed == params.completed)
+        if params.due_from:
+            stmt = stmt.where(Todo.due_date >= params.due_from)
+        if params.due_to:
+            stmt = stmt.where(Todo.due_date <= params.due_to)
+        if params.overdue:
+            stmt = stmt.where(Todo.due_date < date.today(), Todo.completed.is_(False))
+        # +1 wiersz, żeby wiedzieć czy istnieje następna strona
+        stmt = stmt.limit(params.limit + 1)
+    return stmt.order_by(Todo.id.desc())
+
+def _page(rows: List[Row], limit: int) -> Tuple[List[Row], Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
+
+def _search_stmt(dialect: str, user_id: str, params: TodoSearchParams):
+    stmt = select(*_OUT_COLUMNS).where(Todo.user_id == user_id)
+    if params.completed is not None:
+        stmt = stmt.where(Todo.completed == params.completed)
+    if dialect == "postgresql":
+        # Indeks GIN ix_todos_search; składnia zapytania jak w wyszukiwarkach ("a b", -c, "fraza")
+        document = literal_column(SEARCH_DOCUMENT)
+        query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_TS_CONFIG}'"), params.q)
+        stmt = stmt.where(document.op("@@")(query)).order_by(func.ts_rank(document, query).desc())
+    else:
+        # Fallback (SQLite w testach): każde słowo w tytule lub opisie, trafienia w tytule wyżej
+        words = params.q.split()
+        for word in words:
+            stmt = stmt.where(Todo.title.icontains(word, autoescape=True) | Todo.description.icontains(word, autoescape=True))
+        rank = sum(case((Todo.title.icontains(word, autoescape=True), 1), else_=0) for word in words)
+        stmt = stmt.order_by(rank.desc())
+    return stmt.order_by(Todo.id.desc()).limit(params.limit)
+
+def _get_stmt(todo_id: int, user_id: str):
+    return select(*_OUT_COLUMNS).where(Todo.id == todo_id, Todo.user_id == user_id)
+
+# Odczyty list_todos_page / get_todo idą przez todo_cache (read-through),
+# każdy zapis unieważnia listy użytkownika i zmienione todo po commicie.
+
+def _list_key(user_id: str, params: TodoListParams, version: Optional[int]):
+    # Wersja z todo_sync_state w kluczu: zapisy innych procesów (workery, Lambda
+    # cleaner) nie unieważniają lokalnego cache, ale zawsze podbijają wersję
+    return todo_cache.list_key(user_id, (version, params.scope()))
+
+def _token_valid(since: int, state: Tuple[int, int]) -> bool:
+    version, pruned_version = state
+    return pruned_version <= since <= version
+
+def _changes(rows: List[Row], deleted: Sequence[int], version: int):
+    if len(rows) > SYNC_MAX_CHANGES or len(deleted) > SYNC_MAX_CHANGES:
+        return None
+    return rows, list(deleted), version
+
+def _next_version(db: Session, user_id: str) -> int:
+    return db.execute(_bump_version_stmt(db.get_bind().dialect.name, user_id)).scalar_one()
+
+def sync_state(db: Session, user_id: str) -> Tuple[int, int]:
+    """(wersja, pruned_version) użytkownika - odczyt po kluczu głównym, bez cache."""
+    return tuple(db.execute(_sync_state_stmt(user_id)).first() or (0, 0))
+
+def synced_session(db: Session, primary: Optional[Session], user_id: str) -> Tuple[Session, Tuple[int, int]]:
+    """Stan sync z primary oraz sesja do odczytu danych zgodnych z tą wersją.
+
+    Replika (`db`) jest używana tylko, gdy dogoniła wersję z primary - inaczej
+    klient dostałby token nowszy niż dane albo fałszywe 410. `primary` None = brak repliki.
+    """
+    if primary is None:
+        return db, sync_state(db, user_id)
+    state = sync_state(primary, user_id)
+    return (db if sync_state(db, user_id)[0] >= state[0] else primary), state
+
+def list_changes(db: Session, user_id: str, since: int, primary: Optional[Session] = None):
+    """Zmienione wiersze i id usuniętych todo od wersji `since` oraz nowa wersja.
+
+    None, gdy token jest nieaktualny (nagrobki już wyczyszczone, token z
+    przyszłości) albo zmian jest więcej niż SYNC_MAX_CHANGES - klient
+    powinien wtedy pobrać pełną listę. Stan jest czytany przed zmianami:
+    zapis w międzyczasie najwyżej zostanie odesłany ponownie.
+    """
+    db, state = synced_session(db, primary, user_id)
+    if not _token_valid(since, state):
+        return None
+    if since == state[0]:
+        return [], [], since
+    rows = db.execute(_changed_stmt(user_id, since)).all()
+    deleted = db.scalars(_deleted_stmt(user_id, since)).all()
+    return _changes(rows, deleted, state[0])
+
+def create_todo(db: Session, data: TodoCreate, user_id: str):
+    row = db.execute(_insert_stmt([data], user_id, _next_version(db, user_id))).one()
     db.commit()
-    db.refresh(obj)
-    return obj
+    todo_cache.invalidate(user_id)
+    return row
 
 def list_todos(db: Session, user_id: int):
-    return db.query(Todo).filter(Todo.user_id == user_id).order_by(Todo.id.desc()).all()
+    return db.execute(_list_stmt(user_id)).all()
+
+def list_todos_page(db: Session, user_id: str, params: TodoListParams, version: Optional[int] = None):
+    """Strona listy; `version` (z sync_state) wiąże wpis cache z wersją danych użytkownika."""
+    key = _list_key(user_id, params, version)
+    page = todo_cache.get(key)
+    if page is None:
+        rows = db.execute(_list_stmt(user_id, params)).all()
+        page = _page(rows, params.limit)
+        todo_cache.set(key, page)
+    return page
+
+def search_todos(db: Session, user_id: str, params: TodoSearchParams):
+    return db.execute(_search_stmt(db.get_bind().dialect.name, user_id, params)).all()
 
 def get_todo(db: Session, todo_id: int, user_id: int):
-    return db.query(Todo).filter(Todo.id == todo_id, Todo.user_id == user_id).first()
+    key = todo_cache.item_key(user_id, todo_id)
+    row = todo_cache.get(key)
+    if row is None:
+        row = db.execute(_get_stmt(todo_id, user_id)).first()
+        if row is not None:
+            todo_cache.set(key, row)
+    return row
 
 def toggle_done(db: Session, todo_id: int, completed: bool, user_id: int):
-    obj = get_todo(db, todo_id, user_id)
-    if not obj:
-        return None
-    obj.completed = completed
+    row = db.execute(_set_completed_stmt([todo_id], completed, user_id, _next_version(db, user_id))).first()
+    db.commit()
+    todo_cache.invalidate(user_id, [todo_id])
+    return row
+
+def _referenced_keys_stmt(keys: Sequence[str]):
+    return select(Todo.image_key).where(Todo.image_key.in_(keys)).distinct()
+
+def unreferenced_keys(db: Session, keys: Sequence[str]) -> List[str]:
+    """Klucze plików, do których nie odwołuje się już żadne todo (bezpieczne do usunięcia)."""
+    if not keys:
+        return []
+    referenced = set(db.scalars(_referenced_keys_stmt(keys)).all())
+    return [k for k in dict.fromkeys(keys) if k not in referenced]
+
+# Operacje zbiorcze: jedna instrukcja i jedna transakcja na batch
+
+def bulk_create(db: Session, items: Sequence[TodoCreate], user_id: str):
+    rows = db.execute(_insert_stmt(items, user_id, _next_version(db, user_id))).all()
     db.commit()
-    db.refresh(obj)
-    return obj
\ No newline at end of file
+    todo_cache.invalidate(user_id)
+    return rows
+
+def bulk_set_completed(db: Session, todo_ids: Sequence[int], completed: bool, user_id: str):
+    rows = db.execute(_set_completed_stmt(todo_ids, completed, user_id, _next_version(db, user_id))).all()
+    db.commit()
+    todo_cache.invalidate(user_id, todo_ids)
+    return rows
+
+def bulk_delete(db: Session, todo_ids: Sequence[int], user_id: str):
+    version = _next_version(db, user_id)
+    rows = db.execute(_delete_stmt(todo_ids, user_id)).all()
+    if rows:
+        db.execute(_tombstones_stmt([row.id for row in rows], user_id, version))
+    db.commit()
+    todo_cache.invalidate(user_id, todo_ids)
+    return rows
+
@@ -0,0 +1,95 @@
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from .schemas import TodoCreate, TodoListParams, TodoSearchParams
+from .cache import todo_cache
+from .crud import (
+    _list_stmt, _get_stmt, _page, _insert_stmt, _set_completed_stmt, _delete_stmt, _list_key, _referenced_keys_stmt,
+    _search_stmt, _bump_version_stmt, _sync_state_stmt, _tombstones_stmt, _changed_stmt, _deleted_stmt, _token_valid, _changes,
+)
+
+# Async odpowiedniki funkcji z crud.py (DB_ASYNC=true)
+
+async def _next_version(db: AsyncSession, user_id: str) -> int:
+    return (await db.execute(_bump_version_stmt(db.get_bind().dialect.name, user_id))).scalar_one()
+
+async def sync_state(db: AsyncSession, user_id: str) -> Tuple[int, int]:
+    return tuple((await db.execute(_sync_state_stmt(user_id))).first() or (0, 0))
+
+async def synced_session(db: AsyncSession, primary: Optional[AsyncSession], user_id: str):
+    if primary is None:
+        return db, await sync_state(db, user_id)
+    state = await sync_state(primary, user_id)
+    return (db if (await sync_state(db, user_id))[0] >= state[0] else primary), state
+
+async def list_changes(db: AsyncSession, user_id: str, since: int, primary: Optional[AsyncSession] = None):
+    db, state = await synced_session(db, primary, user_id)
+    if not _token_valid(since, state):
+        return None
+    if since == state[0]:
+        return [], [], since
+    rows = (await db.execute(_changed_stmt(user_id, since))).all()
+    deleted = (await db.scalars(_deleted_stmt(user_id, since))).all()
+    return _changes(rows, deleted, state[0])
+
+async def create_todo(db: AsyncSession, data: TodoCreate, user_id: str):
+    row = (await db.execute(_insert_stmt([data], user_id, await _next_version(db, user_id)))).one()
+    await db.commit()
+    todo_cache.invalidate(user_id)
+    return row
+
+async def list_todos(db: AsyncSession, user_id: str):
+    return (await db.execute(_list_stmt(user_id))).all()
+
+async def list_todos_page(db: AsyncSession, user_id: str, params: TodoListParams, version: Optional[int] = None):
+    key = _list_key(user_id, params, version)
+    page = todo_cache.get(key)
+    if page is None:
+        rows = (await db.execute(_list_stmt(user_id, params))).all()
+        page = _page(rows, params.limit)
+        todo_cache.set(key, page)
+    return page
+
+async def search_todos(db: AsyncSession, user_id: str, params: TodoSearchParams):
+    return (await db.execute(_search_stmt(db.get_bind().dialect.name, user_id, params))).all()
+
+async def get_todo(db: AsyncSession, todo_id: int, user_id: str):
+    key = todo_cache.item_key(user_id, todo_id)
+    row = todo_cache.get(key)
+    if row is None:
+        row = (await db.execute(_get_stmt(todo_id, user_id))).first()
+        if row is not None:
+            todo_cache.set(key, row)
+    return row
+
+async def toggle_done(db: AsyncSession, todo_id: int, completed: bool, user_id: str):
+    row = (await db.execute(_set_completed_stmt([todo_id], completed, user_id, await _next_version(db, user_id)))).first()
+    await db.commit()
+    todo_cache.invalidate(user_id, [todo_id])
+    return row
+
+async def unreferenced_keys(db: AsyncSession, keys: Sequence[str]) -> List[str]:
+    if not keys:
+        return []
+    referenced = set((await db.scalars(_referenced_keys_stmt(keys))).all())
+    return [k for k in dict.fromkeys(keys) if k not in referenced]
+
+async def bulk_create(db: AsyncSession, items: Sequence[TodoCreate], user_id: str):
+    rows = (await db.execute(_insert_stmt(items, user_id, await _next_version(db, user_id)))).all()
+    await db.commit()
+    todo_cache.invalidate(user_id)
+    return rows
+
+async def bulk_set_completed(db: AsyncSession, todo_ids: Sequence[int], completed: bool, user_id: str):
+    rows = (await db.execute(_set_completed_stmt(todo_ids, completed, user_id, await _next_version(db, user_id)))).all()
+    await db.commit()
+    todo_cache.invalidate(user_id, todo_ids)
+    return rows
+
+async def bulk_delete(db: AsyncSession, todo_ids: Sequence[int], user_id: str):
+    version = await _next_version(db, user_id)
+    rows = (await db.execute(_delete_stmt(todo_ids, user_id))).all()
+    if rows:
+        await db.execute(_tombstones_stmt([row.id for row in rows], user_id, version))
+    await db.commit()
+    todo_cache.invalidate(user_id, todo_ids)
+    return rows
@@ -0,0 +1,69 @@
+import time
+import threading
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_STATEMENT_SECONDS = Histogram(
+    "db_statement_seconds", "SQL statement execution time", ["engine", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10),
+)
+DB_STATEMENT_ERRORS = Counter("db_statement_errors_total", "Failed SQL statements", ["engine", "operation"])
+# livesum: przy wielu workerach suma po żyjących procesach
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool", ["engine"],
+                            multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Checked-out connections above pool_size", ["engine"],
+                         multiprocess_mode="livesum")
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+_START = "metrics_statement_start"
+
+
+def _operation(statement: str) -> str:
+    # Etykieta = rodzaj zapytania, nie jego tekst (ograniczona kardynalność)
+    head = statement.lstrip()[:6].upper()
+    return head if head in _OPERATIONS else "OTHER"
+
+
+def _pool_stat(engine: Engine, name: str) -> float:
+    # engine.dispose() podmienia pulę; StaticPool/NullPool nie mają pool_size
+    stat = getattr(engine.pool, name, None)
+    return stat() if stat else 0
+
+
+def instrument(engine: Engine, name: str) -> None:
+    """Podpina metryki zapytań i puli połączeń pod silnik (dla async: `async_engine.sync_engine`)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_START, []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info[_START].pop()
+        DB_STATEMENT_SECONDS.labels(name, _operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get(_START):
+            conn.info[_START].pop()
+        DB_STATEMENT_ERRORS.labels(name, _operation(context.statement or "")).inc()
+
+    # Aktualizowane zdarzeniami puli, nie set_function - ta nie działa w trybie multiprocess.
+    # Zdarzenie checkin przychodzi, zanim pula policzy zwrot, stąd własny licznik.
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    overflow = DB_POOL_OVERFLOW.labels(name)
+    state = {"checked_out": 0}
+    lock = threading.Lock()
+
+    def update(delta: int) -> None:
+        with lock:
+            state["checked_out"] += delta
+            size = _pool_stat(engine, "size")
+            checked_out.set(state["checked_out"])
+            overflow.set(max(0, state["checked_out"] - size) if size else 0)
+
+    event.listen(engine, "checkout", lambda *args: update(1))
+    event.listen(engine, "checkin", lambda *args: update(-1))
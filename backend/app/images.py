@@ -0,0 +1,135 @@
+import io
+import os
+import re
+import asyncio
+import logging
+import warnings
+import mimetypes
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from .storage.base import AsyncStorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Dozwolone szerokości miniatur - ?w= zaokrąglane w górę do najbliższej
+IMAGE_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_WIDTHS", "64,128,200,400,800").split(",") if w.strip())
+# Szerokości generowane od razu po uploadzie (pusty = tylko leniwie)
+IMAGE_EAGER_WIDTHS = [int(w) for w in os.getenv("IMAGE_EAGER_WIDTHS", "").split(",") if w.strip()]
+IMAGE_FORMAT = os.getenv("IMAGE_DERIVATIVE_FORMAT", "webp").lower()
+IMAGE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+
+# Klucz pochodny: <oryginał>.w<szerokość>.<format> (patrz też lambda_cleaner/reconcile.py)
+DERIVED_KEY_RE = re.compile(r"^(?P<key>.+)\.w(?P<width>\d+)\.(?:webp|jpeg|png)$")
+
+_RESIZABLE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp")
+
+
+class NotAnImage(Exception):
+    pass
+
+
+def derived_key(key: str, width: int) -> str:
+    return f"{key}.w{width}.{IMAGE_FORMAT}"
+
+
+def derived_keys(key: str) -> List[str]:
+    return [derived_key(key, width) for width in IMAGE_WIDTHS] if is_resizable(key) else []
+
+
+def pick_width(requested: int) -> int:
+    for width in IMAGE_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_WIDTHS[-1]
+
+
+def is_resizable(key: str) -> bool:
+    return (mimetypes.guess_type(key)[0] or "") in _RESIZABLE_TYPES and not DERIVED_KEY_RE.match(key)
+
+
+def render(data: bytes, width: int, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> bytes:
+    """Skaluje obraz do `width` (bez powiększania) i koduje w `fmt`. Uruchamiane w procesie z puli."""
+    from PIL import Image, ImageOps
+
+    with warnings.catch_warnings():
+        # Powyżej MAX_IMAGE_PIXELS Pillow tylko ostrzega (błąd dopiero od 2x) - tu zawsze błąd
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        img = Image.open(io.BytesIO(data))
+    with img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img.thumbnail((width, img.height * width // img.width or 1), Image.LANCZOS)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format=fmt.upper(), quality=quality)
+        return out.getvalue()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_inflight: Dict[str, "asyncio.Future[str]"] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: bez forka procesu z wątkami (threadpool, boto3)
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def _generate(storage: AsyncStorageBackend, key: str, width: int, target: str) -> str:
+    from PIL import Image
+
+    if await storage.exists(target):
+        return target
+
+    data = await storage.read(key)
+    loop = asyncio.get_running_loop()
+    try:
+        rendered = await loop.run_in_executor(_get_pool(), render, data, width)
+    except (OSError, ValueError, Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        # Bomba dekompresyjna (ogromne wymiary) traktowana jak plik nie do zdekodowania
+        raise NotAnImage(str(e))
+    await storage.write(io.BytesIO(rendered), target)
+    logger.info("Generated %s (%d -> %d bytes)", target, len(data), len(rendered))
+    return target
+
+
+async def variant(storage: AsyncStorageBackend, key: str, requested_width: int) -> str:
+    """Zwraca klucz miniatury, generując ją przy pierwszym żądaniu.
+
+    Równoległe żądania o ten sam wariant czekają na jedno generowanie (single-flight).
+    Rzuca FileNotFoundError (brak oryginału) albo NotAnImage.
+    """
+    if not is_resizable(key):
+        raise NotAnImage(key)
+    target = derived_key(key, pick_width(requested_width))
+
+    future = _inflight.get(target)
+    if future is None:
+        future = asyncio.ensure_future(_generate(storage, key, pick_width(requested_width), target))
+        _inflight[target] = future
+        future.add_done_callback(lambda _: _inflight.pop(target, None))
+    return await asyncio.shield(future)
+
+
+async def generate_eager(storage: AsyncStorageBackend, key: str, widths: List[int] = IMAGE_EAGER_WIDTHS) -> None:
+    """Generuje warianty zaraz po uploadzie (BackgroundTasks); błędy tylko logowane."""
+    if not widths or not is_resizable(key):
+        return
+    for width in widths:
+        try:
+            await variant(storage, key, width)
+        except Exception as e:
+            logger.warning("Eager derivative %s@%d failed: %s", key, width, e)
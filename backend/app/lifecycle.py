@@ -0,0 +1,131 @@
+"""Start i zatrzymanie aplikacji (lifespan) oraz stan gotowości dla /ready.
+
+Import `app.main` nie łączy się z niczym: migracje, JWKS, pula połączeń do
+bazy i klient storage są rozgrzewane w tle po starcie. `/` (liveness)
+odpowiada od razu, a `/ready` dopiero gdy wszystkie kroki się udały - ALB
+nie kieruje ruchu do zimnego poda. Nieudany krok jest ponawiany z
+wykładniczym backoffem, więc chwilowa niedostępność zależności nie zabija
+procesu.
+
+Zatrzymanie: uvicorn przestaje przyjmować połączenia od razu po SIGTERM, a
+lifespan shutdown biegnie dopiero potem - flaga ustawiona tylko tam nigdy
+nie byłaby widoczna dla sond. Dlatego SIGTERM najpierw przełącza `/ready`
+na 503 i dopiero po SHUTDOWN_DRAIN_SECONDS uruchamia zwykłe zamknięcie.
+"""
+import os
+import signal
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+
+from . import database, images, migrations
+from .auth import jwks_provider
+from .routes.files import astorage
+
+logger = logging.getLogger(__name__)
+
+# Domyślnie jak dotąd: create_all przy starcie. Wyłączyć, gdy schemat zakłada osobny krok wdrożenia.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "true").lower() in ("true", "1", "yes")
+WARMUP_MAX_BACKOFF = float(os.getenv("WARMUP_MAX_BACKOFF", "30"))
+# Ile sekund po SIGTERM /ready zwraca 503 przy wciąż otwartym nasłuchu (0 = bez opóźnienia).
+# Musi być krótsze od GRACEFUL_TIMEOUT gunicorna.
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "5"))
+
+
+async def _schema() -> None:
+    if DB_CREATE_SCHEMA:
+        await run_in_threadpool(migrations.run, database.engine)
+
+
+async def _database() -> None:
+    if database.DB_ASYNC:
+        await database.warm_async_pool()
+    else:
+        await run_in_threadpool(database.warm_pool)
+
+
+# Kroki wykonywane po kolei; nieudane są ponawiane w kolejnej rundzie
+_STEPS = {
+    "schema": _schema,
+    "database": _database,
+    "jwks": jwks_provider.warm,
+    "storage": astorage.warm,
+}
+
+
+class Readiness:
+    def __init__(self):
+        self.checks: Dict[str, str] = {name: "pending" for name in _STEPS}
+        self.shutting_down = False
+
+    @property
+    def ready(self) -> bool:
+        return not self.shutting_down and all(v == "ok" for v in self.checks.values())
+
+    async def warm_up(self) -> None:
+        backoff = 1.0
+        while True:
+            for name, step in _STEPS.items():
+                if self.checks[name] == "ok":
+                    continue
+                try:
+                    await step()
+                    self.checks[name] = "ok"
+                except Exception as e:
+                    # Bez treści wyjątku - /ready jest dostępne z zewnątrz
+                    self.checks[name] = f"error: {type(e).__name__}"
+                    logger.warning("Warm-up step %s failed, retrying in %.0fs: %s", name, backoff, e)
+            if self.ready:
+                logger.info("Application ready")
+                return
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, WARMUP_MAX_BACKOFF)
+
+
+readiness = Readiness()
+
+
+def install_drain_handler() -> None:
+    """Zastępuje handler SIGTERM uvicorna: 503 na /ready, po odczekaniu SIGINT.
+
+    uvicorn obsługuje SIGINT tak samo jak SIGTERM (łagodne zamknięcie).
+    Handlery sygnałów działają tylko w głównym wątku (nie np. w benchmarkach).
+    """
+    if SHUTDOWN_DRAIN_SECONDS <= 0 or threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+
+    def drain() -> None:
+        if readiness.shutting_down:
+            return
+        readiness.shutting_down = True
+        logger.info("SIGTERM received, draining for %.0fs before shutdown", SHUTDOWN_DRAIN_SECONDS)
+        loop.call_later(SHUTDOWN_DRAIN_SECONDS, signal.raise_signal, signal.SIGINT)
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, drain)
+    except NotImplementedError:  # Windows
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up = asyncio.create_task(readiness.warm_up())
+    install_drain_handler()
+    try:
+        yield
+    finally:
+        readiness.shutting_down = True
+        warm_up.cancel()
+        astorage.shutdown()
+        images.shutdown()
+        database.engine.dispose()
+        database.read_engine.dispose()
+        if database.async_engine is not None:
+            await database.async_engine.dispose()
+            await database.async_read_engine.dispose()
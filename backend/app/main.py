@@ -1,13 +1,18 @@
 import os
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
-from .database import engine, Base
-from .routes import todos, files
+from .admission import AdmissionMiddleware, rate_limit
+from .database import DB_ASYNC
+from .lifecycle import lifespan, readiness
+from .routes import todos, todos_async, files
 
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Todo API (AWS-ready)", lifespan=lifespan)
 
-app = FastAPI(title="Todo API (AWS-ready)")
+# Pod instrumentatorem, żeby odrzucone żądania (503) też trafiały do metryk HTTP;
+# CORS na zewnątrz, żeby przeglądarka mogła odczytać 503
+app.add_middleware(AdmissionMiddleware)
 
 # Prometheus metrics instrumentation
 Instrumentator().instrument(app).expose(app, endpoint="/metrics")
@@ -19,11 +24,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Primary-Until", "X-Sync-Token", "ETag"],
 )
 
-app.include_router(todos.router)
+app.include_router(todos_async.router if DB_ASYNC else todos.router, dependencies=[Depends(rate_limit)])
 app.include_router(files.router)
 
 @app.get("/")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+@app.get("/ready", summary="Readiness: dependencies warmed up")
+def ready():
+    status = "ready" if readiness.ready else "shutting_down" if readiness.shutting_down else "starting"
+    return JSONResponse({"status": status, "checks": readiness.checks}, status_code=200 if readiness.ready else 503)
\ No newline at end of file
@@ -0,0 +1,134 @@
+import logging
+from datetime import date
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from .database import Base
+from .models import Todo, TodoSyncState, TodoTombstone
+
+logger = logging.getLogger(__name__)
+
+# Brak Alembica: create_all tworzy tylko brakujące tabele, więc zmiany
+# w istniejących tabelach są tu dokładane idempotentnie przy starcie.
+#
+# Przy wielu workerach każdy z nich wykonuje run() równolegle: na Postgresie
+# kolejne czekają na blokadę doradczą (i widzą już utworzony schemat), na
+# pozostałych bazach przegrany wyścig "already exists" kończy się powtórką.
+
+_LOCK_ID = 0x746F646F  # "todo"
+_CONVERT_BATCH = 1000
+
+
+def _parse_due_date(value: str):
+    try:
+        return date.fromisoformat(value.strip()[:10])
+    except ValueError:
+        return None
+
+
+# Odpowiednik _parse_due_date w SQL: błąd rzutowania daje NULL zamiast przerwać migrację
+_PG_PARSE_DUE_DATE = """
+    CREATE OR REPLACE FUNCTION pg_temp.todo_parse_due_date(value text) RETURNS date AS $$
+    BEGIN
+        RETURN left(btrim(value), 10)::date;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# Termin: stara kolumna due_date (VARCHAR) -> nowa due_on (DATE), expand/contract.
+#   expand   (start, pod blokadą): ADD COLUMN due_on - bez przepisywania tabeli
+#   backfill (start, po blokadzie): due_on z due_date partiami po _CONVERT_BATCH id,
+#            każda w osobnej krótkiej transakcji; stare pody dalej czytają i piszą due_date
+#   contract (ręcznie, gdy nie ma już starych podów): python -m app.migrations contract-due-date
+#            - ostatni backfill (wiersze dopisane przez stare pody) i DROP COLUMN due_date
+# W trakcie wdrożenia stare pody nie widzą terminów todo utworzonych przez nowe.
+_LEGACY_DUE_DATE = "due_date"
+
+
+def _columns(conn: Connection):
+    return {c["name"]: c["type"] for c in inspect(conn).get_columns(Todo.__tablename__)}
+
+
+def _backfill_batch(conn: Connection, low: int, high: int) -> None:
+    where = "id > :low AND id <= :high AND due_on IS NULL AND due_date IS NOT NULL"
+    bounds = {"low": low, "high": high}
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f"UPDATE todos SET due_on = pg_temp.todo_parse_due_date(due_date::text) WHERE {where}"), bounds)
+        return
+    rows = conn.execute(text(f"SELECT id, due_date FROM todos WHERE {where}"), bounds).all()
+    values = [{"id": i, "due": _parse_due_date(str(v))} for i, v in rows]
+    if values:
+        conn.execute(text("UPDATE todos SET due_on = :due WHERE id = :id"), values)
+
+
+def backfill_due_on(engine: Engine) -> None:
+    """Przepisuje due_date -> due_on dla wierszy bez due_on; idempotentne, bez długich blokad."""
+    with engine.connect() as conn:
+        if _LEGACY_DUE_DATE not in _columns(conn):
+            return
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(_PG_PARSE_DUE_DATE))
+        low, high = conn.execute(text("SELECT min(id), max(id) FROM todos")).one()
+        conn.commit()
+        if low is None:
+            return
+        for start in range(low - 1, high, _CONVERT_BATCH):
+            _backfill_batch(conn, start, start + _CONVERT_BATCH)
+            conn.commit()
+    logger.info("Backfilled todos.due_on from due_date (ids %d-%d)", low, high)
+
+
+def contract_due_date(engine: Engine) -> None:
+    """Usuwa starą kolumnę due_date - dopiero gdy żaden pod nie używa już starego kodu."""
+    backfill_due_on(engine)
+    with engine.begin() as conn:
+        if _LEGACY_DUE_DATE not in _columns(conn):
+            return
+        # SQLite nie usunie kolumny objętej indeksem
+        conn.execute(text("DROP INDEX IF EXISTS ix_todos_user_id_due_date"))
+        conn.execute(text(f"ALTER TABLE todos DROP COLUMN {_LEGACY_DUE_DATE}"))
+    logger.info("Dropped legacy column todos.due_date")
+
+
+def _apply(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+
+    columns = _columns(conn)
+    if "version" not in columns:
+        # Istniejące wiersze dostają wersję 0 - są starsze od każdego tokenu sync
+        conn.execute(text("ALTER TABLE todos ADD COLUMN version BIGINT NOT NULL DEFAULT 0"))
+    if "due_on" not in columns:
+        # Kolumna dopuszczająca NULL, bez domyślnej wartości: zmiana tylko w katalogu
+        conn.execute(text("ALTER TABLE todos ADD COLUMN due_on DATE"))
+
+    for model in (Todo, TodoSyncState, TodoTombstone):
+        for index in model.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def run(engine: Engine, attempts: int = 3) -> None:
+    for attempt in range(1, attempts + 1):
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == "postgresql":
+                    conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _LOCK_ID})
+                _apply(conn)
+            break
+        except (OperationalError, ProgrammingError) as e:
+            if attempt == attempts or "already exists" not in str(e):
+                raise
+            logger.info("Schema created concurrently by another worker, re-checking: %s", e.orig)
+    backfill_due_on(engine)
+
+
+if __name__ == "__main__":
+    import argparse
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Ręczne kroki migracji schematu todos.")
+    parser.add_argument("step", choices=["contract-due-date"])
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    contract_due_date(engine)
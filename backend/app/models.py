@@ -1,15 +1,68 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+import os
+import re
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, Text, Index, text
 from sqlalchemy.sql import func
 from .database import Base
 
+# Konfiguracja tekstowa Postgresa dla wyszukiwania; 'simple' nie wymaga słownika
+# języka. Zmiana wymaga przebudowania indeksu ix_todos_search.
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "simple")
+if not re.fullmatch(r"\w+", SEARCH_TS_CONFIG):
+    raise ValueError(f"Invalid SEARCH_TS_CONFIG: {SEARCH_TS_CONFIG!r}")
+
+# Wyrażenie indeksu pełnotekstowego - zapytanie musi użyć dokładnie tego samego
+# tekstu (literały, nie parametry), żeby planer dopasował indeks
+SEARCH_DOCUMENT = f"to_tsvector('{SEARCH_TS_CONFIG}', coalesce(title, '') || ' ' || coalesce(description, ''))"
+
 class Todo(Base):
     __tablename__ = "todos"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
-    due_date = Column(String(32), nullable=True)
+    # Kolumna due_on: stara due_date (VARCHAR) jest wygaszana przez expand/contract (migrations.py)
+    due_date = Column("due_on", Date, nullable=True)
     completed = Column(Boolean, default=False)
     image_key = Column(String(512), nullable=True)
     user_id = Column(String(36), index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Wersja ostatniej zmiany (licznik TodoSyncState użytkownika w chwili zapisu)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Paginacja keyset: WHERE user_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_todos_user_id_id", "user_id", "id"),
+        # Delta sync: WHERE user_id = ? AND version > ? ORDER BY version
+        Index("ix_todos_user_id_version", "user_id", "version"),
+        # Filtry terminu (due_from/due_to/overdue) w obrębie użytkownika
+        Index("ix_todos_user_id_due_on", "user_id", "due_on"),
+        # Wyszukiwanie pełnotekstowe (tylko Postgres; SQLite szuka przez LIKE)
+        Index("ix_todos_search", text(SEARCH_DOCUMENT), postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+class TodoSyncState(Base):
+    """Licznik zmian per użytkownik - podbijany w tej samej transakcji co każdy zapis.
+
+    Blokada wiersza szereguje zapisy jednego użytkownika, więc wersje są
+    commitowane w kolejności rosnącej i klient nie przeskoczy zmiany, która
+    jeszcze się nie zacommitowała. `pruned_version` to najwyższa wersja
+    usuniętych nagrobków - starszy token sync jest już nieważny.
+    """
+    __tablename__ = "todo_sync_state"
+    user_id = Column(String(36), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    pruned_version = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+class TodoTombstone(Base):
+    """Ślad po usuniętym todo (przez API albo lambda_cleaner) dla delta sync."""
+    __tablename__ = "todo_tombstones"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(36), nullable=False)
+    todo_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ix_todo_tombstones_user_id_version", "user_id", "version"),
+        # Czyszczenie starych nagrobków po czasie
+        Index("ix_todo_tombstones_deleted_at", "deleted_at"),
+    )
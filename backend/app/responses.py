@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import FileResponse, JSONResponse
+from starlette.types import Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # opcjonalny, szybszy encoder JSON
+    orjson = None
+
+# Klucze plików nigdy się nie zmieniają po uploadzie
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Odpowiedzi per użytkownik: przeglądarka trzyma kopię, ale zawsze rewaliduje ETagiem
+PRIVATE_REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def rows_response(rows, headers: Optional[Mapping[str, str]] = None) -> FastJSONResponse:
+    """Serializuje wiersze z projekcji kolumn bez ponownej walidacji Pydantic.
+
+    Kolumny zapytania odpowiadają 1:1 polom `schemas.TodoOut` (crud._OUT_COLUMNS).
+    """
+    return FastJSONResponse([row._asdict() for row in rows], headers=headers)
+
+
+def row_response(row) -> FastJSONResponse:
+    return FastJSONResponse(row._asdict())
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Silny ETag z rozmiaru i mtime (ns) pliku."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def version_etag(version: int, *scope: str) -> str:
+    """Słaby ETag z wersji danych i zakresu odpowiedzi (użytkownik, parametry zapytania)."""
+    digest = hashlib.sha1("\0".join(scope).encode()).hexdigest()[:16]
+    return f'W/"{version:x}-{digest}"'
+
+
+def etag_matches(request_headers: Mapping[str, str], etag: str) -> Optional[bool]:
+    """Słabe porównanie z If-None-Match; None, gdy nagłówka brak."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, stat_result: os.stat_result) -> bool:
+    """Warunkowy GET: If-None-Match ma pierwszeństwo przed If-Modified-Since."""
+    matches = etag_matches(request_headers, etag)
+    if matches is not None:
+        return matches
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parsuje pojedynczy zakres `bytes=start-end` i zwraca (start, end) włącznie.
+
+    Zwraca None, gdy nagłówka brak albo zawiera kilka zakresów (wtedy
+    wysyłamy cały plik) albo jest niepoprawny składniowo. Rzuca ValueError tylko
+    dla poprawnego zakresu niemożliwego do spełnienia.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+
+    start_s, _, end_s = spec.partition("-")
+    # Nagłówek niezgodny ze składnią jest ignorowany (RFC 9110 §14.2) - cały plik
+    if not (start_s or end_s) or any(v and not v.isdigit() for v in (start_s, end_s)):
+        return None
+    if not start_s:
+        # bytes=-N -> ostatnie N bajtów
+        length = int(end_s)
+        if length <= 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+
+    start = int(start_s)
+    if end_s and int(end_s) < start:
+        return None
+    end = int(end_s) if end_s else size - 1
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(FileResponse):
+    """FileResponse z obsługą Range (206) i ścieżką sendfile.
+
+    Jeśli serwer ASGI udostępnia rozszerzenie `http.response.zerocopysend`,
+    plik jest wysyłany przez sendfile jądra; w przeciwnym razie czytany
+    kawałkami w wątku, jak w FileResponse.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        stat_result: os.stat_result,
+        byte_range: Optional[Tuple[int, int]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        super().__init__(path, headers=headers, media_type=media_type, stat_result=stat_result)
+        size = stat_result.st_size
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["etag"] = file_etag(stat_result)
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        if byte_range is None:
+            self.offset, self.count = 0, size
+        else:
+            start, end = byte_range
+            self.offset, self.count = start, end - start + 1
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope["method"].upper() == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -1,13 +1,56 @@
 import os
 import mimetypes
-from io import BytesIO
-from fastapi import APIRouter, UploadFile, File, HTTPException, Response, Depends
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Query, Request, Response, Depends
 from fastapi.responses import RedirectResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 
 from ..auth import get_current_user
+from ..admission import rate_limit
+from .. import images, schemas
+from ..responses import FileRangeResponse, IMMUTABLE_CACHE_CONTROL, file_etag, is_not_modified, parse_range
+from ..storage.base import AsyncStorageBackend, LimitedReader, FileTooLarge, MAX_UPLOAD_SIZE
 from ..storage.local import LocalStorage
+from ..storage.instrumented import InstrumentedStorage
 
-router = APIRouter(prefix="/api/files", tags=["files"])
+# Zapas na nagłówki części i granice multipart ponad sam plik
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class _BodyLimitRoute(APIRoute):
+    """Odrzuca za duże ciało żądania (413), zanim Starlette sparsuje i zbuforuje formularz.
+
+    Content-Length jest sprawdzany od razu, a ciało bez niego (chunked) jest
+    liczone w trakcie odbioru i przerywane po przekroczeniu limitu. Dokładny
+    limit na sam plik nadal pilnuje LimitedReader w upload_file.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request) -> Response:
+            limit = MAX_UPLOAD_SIZE + _MULTIPART_OVERHEAD
+            length = request.headers.get("content-length", "")
+            if length.isdigit() and int(length) > limit:
+                raise HTTPException(status_code=413, detail="File too large")
+
+            received = 0
+
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail="File too large")
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/api/files", tags=["files"], route_class=_BodyLimitRoute)
 
 USE_S3 = bool(os.getenv("S3_BUCKET_NAME"))
 if USE_S3:
@@ -15,31 +58,103 @@ if USE_S3:
     storage = S3Storage()
 else:
     storage = LocalStorage()
+storage = InstrumentedStorage(storage)
+
+# Content-addressed storage: identyczne pliki zapisywane raz (klucz = sha256)
+if os.getenv("STORAGE_DEDUP", "false").lower() in ("true", "1", "yes"):
+    from ..storage.dedup import ContentAddressedStorage
+    storage = ContentAddressedStorage(storage)
+
+# Dla tras async: blokujące wywołania na osobnym, ograniczonym executorze
+astorage = AsyncStorageBackend(storage)
 
-@router.post("/", summary="Upload file")
-async def upload_file(file: UploadFile = File(...), current_user = Depends(get_current_user)):
-    content = await file.read()
-    key = storage.save(BytesIO(content), file.filename)
+# np. "image/,application/pdf" - pusty = dowolny typ
+UPLOAD_ALLOWED_TYPES = [t.strip() for t in os.getenv("UPLOAD_ALLOWED_TYPES", "").split(",") if t.strip()]
 
-    url = storage.get_file_url(key) or f"/api/files/{key}"
+def delete_files(keys) -> None:
+    """Best-effort usuwanie plików (wraz z miniaturami) po skasowaniu todo (BackgroundTasks)."""
+    for key in keys:
+        for k in [key] + images.derived_keys(key):
+            try:
+                storage.delete(k)
+            except Exception:
+                pass
+
+@router.post("/", summary="Upload file", dependencies=[Depends(rate_limit)])
+async def upload_file(background: BackgroundTasks, file: UploadFile = File(...), current_user = Depends(get_current_user)):
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        key = await astorage.save(LimitedReader(file.file, MAX_UPLOAD_SIZE), file.filename)
+    except FileTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    background.add_task(images.generate_eager, astorage, key)
+    url = await astorage.get_file_url(key) or f"/api/files/{key}"
     return {"key": key, "url": url}
 
+@router.post("/presign", response_model=schemas.UploadTicket, summary="Presigned direct upload to S3", dependencies=[Depends(rate_limit)])
+def presign_upload(data: schemas.UploadRequest, current_user = Depends(get_current_user)):
+    """Zwraca presigned POST/PUT dla klucza wygenerowanego przez serwer.
+
+    Klient wysyła plik bezpośrednio do S3/MinIO, a potem podaje `key`
+    jako `image_key` przy tworzeniu todo.
+    """
+    if not USE_S3:
+        raise HTTPException(status_code=501, detail="Direct uploads require S3 storage")
+    if data.size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    content_type = data.content_type or mimetypes.guess_type(data.filename)[0] or "application/octet-stream"
+    if UPLOAD_ALLOWED_TYPES and not any(content_type.startswith(t) for t in UPLOAD_ALLOWED_TYPES):
+        raise HTTPException(status_code=415, detail="Content type not allowed")
+
+    key = storage.new_upload_key(data.filename)
+    ticket = storage.presign_upload(key, content_type, data.size, MAX_UPLOAD_SIZE, data.method)
+    return {"key": key, "expires_in": storage.expires, **ticket}
+
 @router.get("/{key}", summary="Download file or redirect to S3")
-def download_file(key: str):
+async def download_file(key: str, request: Request, w: Optional[int] = Query(None, ge=1, description="Thumbnail width")):
+    if w is not None:
+        try:
+            key = await images.variant(astorage, key, w)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        except images.NotAnImage:
+            raise HTTPException(status_code=415, detail="Resizing is only supported for images")
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Image resizing is not available (Pillow not installed)")
+    return await run_in_threadpool(_serve_file, key, request)
+
+def _serve_file(key: str, request: Request):
     if USE_S3:
-        url = storage.get_file_url(key)
+        url, max_age = storage.get_cached_file_url(key)
         if not url:
             raise HTTPException(status_code=404, detail="File not found")
-        return RedirectResponse(url=url, status_code=307)
+        # Redirect może być cache'owany tak długo, jak długo URL pozostaje ważny
+        return RedirectResponse(url=url, status_code=307, headers={"Cache-Control": f"public, max-age={max_age}"})
 
     try:
-        f = storage.open(key)
-        data = f.read()
-        f.close()
-        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
-        headers = {}
-        if not content_type.startswith("image/"):
-            headers["Content-Disposition"] = f'attachment; filename="{key}"'
-        return Response(content=data, media_type=content_type, headers=headers)
+        path = storage.path(key)
+        stat_result = os.stat(path)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
+
+    etag = file_etag(stat_result)
+    content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if not content_type.startswith("image/"):
+        headers["Content-Disposition"] = f'attachment; filename="{key}"'
+
+    if is_not_modified(request.headers, etag, stat_result):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), stat_result.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{stat_result.st_size}"})
+
+    return FileRangeResponse(path, stat_result, byte_range, headers=headers, media_type=content_type)
@@ -1,29 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Annotated
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from ..auth import get_current_user
-from ..database import get_db
+from ..consistency import get_primary_db, get_read_db, get_write_db
+from .files import storage, delete_files
+from ..responses import FastJSONResponse, PRIVATE_REVALIDATE_CACHE_CONTROL, etag_matches, rows_response, row_response, version_etag
 from .. import crud, schemas
 
 router = APIRouter(prefix="/api/todos", tags=["todos"])
 
 @router.get("/", response_model=list[schemas.TodoOut])
-def list_all(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    return crud.list_todos(db, current_user['sub'])
+def list_all(
+    params: Annotated[schemas.TodoListParams, Query()],
+    request: Request,
+    db: Session = Depends(get_read_db),
+    primary: Session = Depends(get_primary_db),
+    current_user = Depends(get_current_user),
+):
+    # Wersja czytana przed listą: zapis w międzyczasie da najwyżej zbędne 200, nigdy fałszywe 304
+    db, (version, _) = crud.synced_session(db, primary, current_user['sub'])
+    headers = {
+        "ETag": version_etag(version, current_user['sub'], params.scope()),
+        "X-Sync-Token": schemas.encode_sync_token(version),
+        "Cache-Control": PRIVATE_REVALIDATE_CACHE_CONTROL,
+        "Vary": "Authorization",
+    }
+    if etag_matches(request.headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    items, next_cursor = crud.list_todos_page(db, current_user['sub'], params, version)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return rows_response(items, headers)
+
+@router.get("/search", response_model=list[schemas.TodoOut])
+def search(
+    params: Annotated[schemas.TodoSearchParams, Query()],
+    db: Session = Depends(get_read_db),
+    current_user = Depends(get_current_user),
+):
+    return rows_response(crud.search_todos(db, current_user['sub'], params))
+
+@router.get("/changes", response_model=schemas.TodoChanges)
+def list_changes(since: str, db: Session = Depends(get_read_db), primary: Session = Depends(get_primary_db),
+                       current_user = Depends(get_current_user)):
+    """Delta sync: todo zmienione i usunięte od tokenu `since` (X-Sync-Token z listy lub poprzedni `token`).
+
+    Klient stosuje najpierw `deleted`, potem `changed`. 410 oznacza, że trzeba pobrać listę od nowa.
+    """
+    try:
+        version = schemas.decode_sync_token(since)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    changes = crud.list_changes(db, current_user['sub'], version, primary)
+    if changes is None:
+        raise HTTPException(410, "Sync token expired, reload the list")
+    rows, deleted, version = changes
+    return FastJSONResponse({
+        "changed": [row._asdict() for row in rows],
+        "deleted": deleted,
+        "token": schemas.encode_sync_token(version),
+    })
+
+# Trasy /bulk muszą być przed /{todo_id}
+@router.post("/bulk", response_model=list[schemas.TodoOut])
+def bulk_create(data: schemas.TodoBulkCreate, db: Session = Depends(get_write_db), current_user = Depends(get_current_user)):
+    for item in data.items:
+        if item.image_key and not storage.exists(item.image_key):
+            raise HTTPException(400, f"Uploaded file not found: {item.image_key}")
+    return crud.bulk_create(db, data.items, current_user['sub'])
+
+@router.post("/bulk/complete", response_model=list[schemas.BulkItemResult])
+def bulk_complete(data: schemas.TodoIds, db: Session = Depends(get_write_db), current_user = Depends(get_current_user)):
+    rows = crud.bulk_set_completed(db, data.ids, True, current_user['sub'])
+    return schemas.bulk_results(data.ids, rows)
+
+@router.post("/bulk/delete", response_model=list[schemas.BulkItemResult])
+def bulk_delete(data: schemas.TodoIds, background: BackgroundTasks, db: Session = Depends(get_write_db), current_user = Depends(get_current_user)):
+    rows = crud.bulk_delete(db, data.ids, current_user['sub'])
+    # Ten sam plik może być podpięty pod inne todo (np. deduplikacja) - usuń tylko nieużywane
+    keys = crud.unreferenced_keys(db, [row.image_key for row in rows if row.image_key])
+    background.add_task(delete_files, keys)
+    return schemas.bulk_results(data.ids, rows)
 
 @router.get("/{todo_id}", response_model=schemas.TodoOut)
-def get_one(todo_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+def get_one(todo_id: int, db: Session = Depends(get_read_db), current_user = Depends(get_current_user)):
     obj = crud.get_todo(db, todo_id, current_user['sub'])
     if not obj:
         raise HTTPException(404, "Todo not found")
-    return obj
+    return row_response(obj)
 
 @router.post("/", response_model=schemas.TodoOut)
-def create(data: schemas.TodoCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+def create(data: schemas.TodoCreate, db: Session = Depends(get_write_db), current_user = Depends(get_current_user)):
+    # image_key z bezpośredniego uploadu (presign) - potwierdź, że obiekt istnieje
+    if data.image_key and not storage.exists(data.image_key):
+        raise HTTPException(400, "Uploaded file not found")
     return crud.create_todo(db, data, current_user['sub'])
 
 @router.post("/{todo_id}/complete", response_model=schemas.TodoOut)
-def mark_complete(todo_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+def mark_complete(todo_id: int, db: Session = Depends(get_write_db), current_user = Depends(get_current_user)):
     obj = crud.toggle_done(db, todo_id, True, current_user['sub'])
     if not obj:
         raise HTTPException(404, "Todo not found")
@@ -0,0 +1,105 @@
+from typing import Annotated
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..auth import get_current_user
+from ..consistency import get_async_primary_db, get_async_read_db, get_async_write_db
+from .files import astorage, delete_files
+from ..responses import FastJSONResponse, PRIVATE_REVALIDATE_CACHE_CONTROL, etag_matches, rows_response, row_response, version_etag
+from .. import crud_async, schemas
+
+# Odpowiednik routes/todos.py dla DB_ASYNC=true (bez threadpoola na czas zapytania)
+router = APIRouter(prefix="/api/todos", tags=["todos"])
+
+@router.get("/", response_model=list[schemas.TodoOut])
+async def list_all(
+    params: Annotated[schemas.TodoListParams, Query()],
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
+    primary: AsyncSession = Depends(get_async_primary_db),
+    current_user = Depends(get_current_user),
+):
+    # Wersja czytana przed listą: zapis w międzyczasie da najwyżej zbędne 200, nigdy fałszywe 304
+    db, (version, _) = await crud_async.synced_session(db, primary, current_user['sub'])
+    headers = {
+        "ETag": version_etag(version, current_user['sub'], params.scope()),
+        "X-Sync-Token": schemas.encode_sync_token(version),
+        "Cache-Control": PRIVATE_REVALIDATE_CACHE_CONTROL,
+        "Vary": "Authorization",
+    }
+    if etag_matches(request.headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    items, next_cursor = await crud_async.list_todos_page(db, current_user['sub'], params, version)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return rows_response(items, headers)
+
+@router.get("/search", response_model=list[schemas.TodoOut])
+async def search(
+    params: Annotated[schemas.TodoSearchParams, Query()],
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user = Depends(get_current_user),
+):
+    return rows_response(await crud_async.search_todos(db, current_user['sub'], params))
+
+@router.get("/changes", response_model=schemas.TodoChanges)
+async def list_changes(since: str, db: AsyncSession = Depends(get_async_read_db), primary: AsyncSession = Depends(get_async_primary_db),
+                       current_user = Depends(get_current_user)):
+    """Delta sync: todo zmienione i usunięte od tokenu `since` (X-Sync-Token z listy lub poprzedni `token`).
+
+    Klient stosuje najpierw `deleted`, potem `changed`. 410 oznacza, że trzeba pobrać listę od nowa.
+    """
+    try:
+        version = schemas.decode_sync_token(since)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    changes = await crud_async.list_changes(db, current_user['sub'], version, primary)
+    if changes is None:
+        raise HTTPException(410, "Sync token expired, reload the list")
+    rows, deleted, version = changes
+    return FastJSONResponse({
+        "changed": [row._asdict() for row in rows],
+        "deleted": deleted,
+        "token": schemas.encode_sync_token(version),
+    })
+
+# Trasy /bulk muszą być przed /{todo_id}
+@router.post("/bulk", response_model=list[schemas.TodoOut])
+async def bulk_create(data: schemas.TodoBulkCreate, db: AsyncSession = Depends(get_async_write_db), current_user = Depends(get_current_user)):
+    for item in data.items:
+        if item.image_key and not await astorage.exists(item.image_key):
+            raise HTTPException(400, f"Uploaded file not found: {item.image_key}")
+    return await crud_async.bulk_create(db, data.items, current_user['sub'])
+
+@router.post("/bulk/complete", response_model=list[schemas.BulkItemResult])
+async def bulk_complete(data: schemas.TodoIds, db: AsyncSession = Depends(get_async_write_db), current_user = Depends(get_current_user)):
+    rows = await crud_async.bulk_set_completed(db, data.ids, True, current_user['sub'])
+    return schemas.bulk_results(data.ids, rows)
+
+@router.post("/bulk/delete", response_model=list[schemas.BulkItemResult])
+async def bulk_delete(data: schemas.TodoIds, background: BackgroundTasks, db: AsyncSession = Depends(get_async_write_db), current_user = Depends(get_current_user)):
+    rows = await crud_async.bulk_delete(db, data.ids, current_user['sub'])
+    # Ten sam plik może być podpięty pod inne todo (np. deduplikacja) - usuń tylko nieużywane
+    keys = await crud_async.unreferenced_keys(db, [row.image_key for row in rows if row.image_key])
+    background.add_task(delete_files, keys)
+    return schemas.bulk_results(data.ids, rows)
+
+@router.get("/{todo_id}", response_model=schemas.TodoOut)
+async def get_one(todo_id: int, db: AsyncSession = Depends(get_async_read_db), current_user = Depends(get_current_user)):
+    obj = await crud_async.get_todo(db, todo_id, current_user['sub'])
+    if not obj:
+        raise HTTPException(404, "Todo not found")
+    return row_response(obj)
+
+@router.post("/", response_model=schemas.TodoOut)
+async def create(data: schemas.TodoCreate, db: AsyncSession = Depends(get_async_write_db), current_user = Depends(get_current_user)):
+    if data.image_key and not await astorage.exists(data.image_key):
+        raise HTTPException(400, "Uploaded file not found")
+    return await crud_async.create_todo(db, data, current_user['sub'])
+
+@router.post("/{todo_id}/complete", response_model=schemas.TodoOut)
+async def mark_complete(todo_id: int, db: AsyncSession = Depends(get_async_write_db), current_user = Depends(get_current_user)):
+    obj = await crud_async.toggle_done(db, todo_id, True, current_user['sub'])
+    if not obj:
+        raise HTTPException(404, "Todo not found")
+    return obj
@@ -1,20 +1,131 @@
-from pydantic import BaseModel
-from typing import Optional
+import os
+import base64
+from datetime import date
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Literal, Optional
+
+TODOS_PAGE_SIZE = int(os.getenv("TODOS_PAGE_SIZE", "100"))
+TODOS_MAX_PAGE_SIZE = int(os.getenv("TODOS_MAX_PAGE_SIZE", "500"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "500"))
+# Więcej zmian od tokenu niż ten limit -> 410, klient pobiera listę od nowa
+SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", "1000"))
 
 class TodoCreate(BaseModel):
     title: str
     description: Optional[str] = None
-    due_date: Optional[str] = None
+    due_date: Optional[date] = None
     image_key: Optional[str] = None
 
+class UploadRequest(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    size: int = Field(gt=0)
+    method: Literal["POST", "PUT"] = "POST"
+
+class UploadTicket(BaseModel):
+    key: str
+    method: str
+    url: str
+    fields: Dict[str, str]
+    headers: Dict[str, str]
+    expires_in: int
+
 class TodoOut(BaseModel):
     id: int
     title: str
     description: Optional[str]
-    due_date: Optional[str]
+    due_date: Optional[date]
     completed: bool
     image_key: Optional[str]
+    version: int
 
     class Config:
         from_attributes = True
 
+class TodoBulkCreate(BaseModel):
+    items: List[TodoCreate] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+class TodoIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: Literal["ok", "not_found"]
+    todo: Optional[TodoOut] = None
+
+def bulk_results(ids: List[int], rows) -> List[BulkItemResult]:
+    """Wynik per element dla operacji zbiorczych (w kolejności żądania)."""
+    found = {row.id: row for row in rows}
+    return [
+        BulkItemResult(id=i, status="ok", todo=found[i]) if i in found else BulkItemResult(id=i, status="not_found")
+        for i in ids
+    ]
+
+def _encode_token(prefix: str, value: int) -> str:
+    return base64.urlsafe_b64encode(f"{prefix}:{value}".encode()).decode().rstrip("=")
+
+def _decode_token(expected: str, token: str) -> int:
+    raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    prefix, _, value = raw.partition(":")
+    if prefix != expected:
+        raise ValueError
+    return int(value)
+
+def encode_cursor(todo_id: int) -> str:
+    return _encode_token("id", todo_id)
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return _decode_token("id", cursor)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+def encode_sync_token(version: int) -> str:
+    return _encode_token("v", version)
+
+def decode_sync_token(token: str) -> int:
+    try:
+        return _decode_token("v", token)
+    except ValueError:
+        raise ValueError("Invalid sync token")
+
+class TodoChanges(BaseModel):
+    """Odpowiedź GET /api/todos/changes: zmienione i usunięte todo od tokenu."""
+    changed: List[TodoOut]
+    deleted: List[int]
+    token: str
+
+class TodoListParams(BaseModel):
+    """Parametry GET /api/todos/ (paginacja keyset + filtry)."""
+    limit: int = Field(TODOS_PAGE_SIZE, ge=1, le=TODOS_MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    completed: Optional[bool] = None
+    due_from: Optional[date] = None
+    due_to: Optional[date] = None
+    # Nieukończone z terminem przed dzisiejszym dniem
+    overdue: bool = False
+
+    @field_validator("cursor")
+    @classmethod
+    def _check_cursor(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            decode_cursor(value)
+        return value
+
+    def scope(self) -> str:
+        """Zakres wyniku dla ETag i klucza cache; `overdue` zależy też od dzisiejszej daty."""
+        scope = self.model_dump_json()
+        return f"{scope}|{date.today().isoformat()}" if self.overdue else scope
+
+class TodoSearchParams(BaseModel):
+    """Parametry GET /api/todos/search (wyniki od najlepiej dopasowanych)."""
+    q: str = Field(min_length=1, max_length=200)
+    limit: int = Field(TODOS_PAGE_SIZE, ge=1, le=TODOS_MAX_PAGE_SIZE)
+    completed: Optional[bool] = None
+
+    @field_validator("q")
+    @classmethod
+    def _check_query(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("Empty search query")
+        return value.strip()
@@ -1,10 +1,55 @@
+import os
+import asyncio
+import functools
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import BinaryIO, Optional
 
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MB
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))  # 50 MB
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+class LimitedReader:
+    """Read-only stream wrapper that fails once more than `limit` bytes were read."""
+
+    def __init__(self, fileobj: BinaryIO, limit: int = MAX_UPLOAD_SIZE):
+        self._fileobj = fileobj
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        # Read one byte past the limit so an exactly-sized file is still accepted
+        data = self._fileobj.read(min(size, self.limit - self.bytes_read + 1))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise FileTooLarge(f"File exceeds {self.limit} bytes")
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
 
 class StorageBackend(ABC):
+    # Max number of blocking calls AsyncStorageBackend runs against this backend at once
+    max_concurrency: int = 8
+
     @abstractmethod
     def save(self, fileobj: BinaryIO, filename: str) -> str:
+        """Stream `fileobj` to storage in CHUNK_SIZE pieces and return its key."""
+        pass
+
+    @abstractmethod
+    def write(self, fileobj: BinaryIO, key: str) -> None:
+        """Stream `fileobj` to storage under an explicit `key`."""
         pass
 
     @abstractmethod
@@ -15,5 +60,79 @@ class StorageBackend(ABC):
     def delete(self, key: str) -> bool:
         pass
 
+    def exists(self, key: str) -> bool:
+        try:
+            self.open(key).close()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def touch(self, key: str) -> bool:
+        """Refresh the modification time of `key`; False if it does not exist.
+
+        Backends without a modification time only check existence.
+        """
+        return self.exists(key)
+
     def get_file_url(self, key: str) -> Optional[str]:
         return None
+
+    def warm(self) -> None:
+        """Initialize clients/connections ahead of the first request (readiness probe)."""
+        pass
+
+
+class AsyncStorageBackend:
+    """Async facade over a StorageBackend for use from `async def` routes.
+
+    Blocking calls run on a dedicated executor bounded by the backend's
+    `max_concurrency`, instead of the shared anyio threadpool that also serves
+    sync routes and dependencies - a burst of uploads queues here rather than
+    starving everything else on the worker.
+    """
+
+    def __init__(self, backend: StorageBackend, max_concurrency: Optional[int] = None):
+        self.backend = backend
+        self.max_concurrency = max_concurrency or backend.max_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="storage-io")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def save(self, fileobj: BinaryIO, filename: str) -> str:
+        return await self._run(self.backend.save, fileobj, filename)
+
+    async def write(self, fileobj: BinaryIO, key: str) -> None:
+        await self._run(self.backend.write, fileobj, key)
+
+    async def open(self, key: str) -> BinaryIO:
+        return await self._run(self.backend.open, key)
+
+    async def read(self, key: str) -> bytes:
+        def read():
+            with self.backend.open(key) as f:
+                return f.read()
+        return await self._run(read)
+
+    async def delete(self, key: str) -> bool:
+        return await self._run(self.backend.delete, key)
+
+    async def exists(self, key: str) -> bool:
+        return await self._run(self.backend.exists, key)
+
+    async def get_file_url(self, key: str) -> Optional[str]:
+        return await self._run(self.backend.get_file_url, key)
+
+    async def warm(self) -> None:
+        await self._run(self.backend.warm)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
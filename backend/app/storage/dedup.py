@@ -0,0 +1,79 @@
+import os
+import re
+import hashlib
+import tempfile
+from typing import BinaryIO, Optional
+
+from prometheus_client import Counter
+
+from .base import StorageBackend, CHUNK_SIZE
+
+DEDUP_UPLOADS = Counter("storage_dedup_uploads_total", "Content-addressed uploads", ["result"])
+
+
+class ContentAddressedStorage(StorageBackend):
+    """Deduplicating wrapper: each unique blob is stored once under its SHA-256.
+
+    The upload is hashed while it is spooled (CHUNK_SIZE in memory, the rest on
+    disk); if a blob with that digest already exists the write is skipped
+    entirely: the existing blob is only touched (a self-copy instead of a PUT
+    on S3), so its modification time is the newest upload's and the orphan
+    reconcile grace period covers the todo that is about to reference it.
+    Keys keep the file extension so content types can still be derived from them.
+
+    A key may be shared by many todos - deleting it is only safe after checking
+    that nothing references it any more (see crud.unreferenced_keys).
+    """
+
+    def __init__(self, inner: StorageBackend):
+        self.inner = inner
+        self.max_concurrency = inner.max_concurrency
+
+    def __getattr__(self, name):
+        # get_cached_file_url, presign_upload, path, ... of the wrapped backend
+        return getattr(self.inner, name)
+
+    def _extension(self, filename: str) -> str:
+        ext = os.path.splitext(os.path.basename(filename))[1].lower()
+        return ext if re.fullmatch(r"\.[a-z0-9]{1,10}", ext) else ""
+
+    def save(self, fileobj: BinaryIO, filename: str) -> str:
+        digest = hashlib.sha256()
+        with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE) as spool:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spool.write(chunk)
+
+            key = f"{digest.hexdigest()}{self._extension(filename)}"
+            if self.inner.touch(key):
+                DEDUP_UPLOADS.labels("duplicate").inc()
+                return key
+
+            spool.seek(0)
+            self.inner.write(spool, key)
+            DEDUP_UPLOADS.labels("stored").inc()
+            return key
+
+    def write(self, fileobj: BinaryIO, key: str) -> None:
+        self.inner.write(fileobj, key)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.inner.open(key)
+
+    def exists(self, key: str) -> bool:
+        return self.inner.exists(key)
+
+    def touch(self, key: str) -> bool:
+        return self.inner.touch(key)
+
+    def delete(self, key: str) -> bool:
+        return self.inner.delete(key)
+
+    def get_file_url(self, key: str) -> Optional[str]:
+        return self.inner.get_file_url(key)
+
+    def warm(self) -> None:
+        self.inner.warm()
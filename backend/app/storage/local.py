@@ -1,14 +1,17 @@
 import os
 import re
+import shutil
 from typing import BinaryIO, Optional
 from datetime import datetime
-from .base import StorageBackend
+from .base import StorageBackend, CHUNK_SIZE
 
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", "/app/uploads")
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
 
 class LocalStorage(StorageBackend):
+    max_concurrency = int(os.getenv("LOCAL_STORAGE_CONCURRENCY", "8"))
+
     def _sanitize(self, filename: str) -> str:
         name = os.path.basename(filename)
         return re.sub(r"[^A-Za-z0-9._-]+", "_", name) or "file"
@@ -17,14 +20,43 @@ class LocalStorage(StorageBackend):
         ts = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
         safe = self._sanitize(filename)
         key = f"{ts}_{safe}"
-        path = os.path.join(MEDIA_ROOT, key)
-        with open(path, "wb") as f:
-            f.write(fileobj.read())
+        self.write(fileobj, key)
         return key
 
+    def write(self, fileobj: BinaryIO, key: str) -> None:
+        path = self.path(key)
+        try:
+            with open(path, "wb") as f:
+                shutil.copyfileobj(fileobj, f, CHUNK_SIZE)
+        except BaseException:
+            self.delete(key)
+            raise
+
+    def path(self, key: str) -> str:
+        if not key or key in (".", "..") or os.path.basename(key) != key:
+            raise FileNotFoundError(key)
+        return os.path.join(MEDIA_ROOT, key)
+
+    def warm(self) -> None:
+        os.makedirs(MEDIA_ROOT, exist_ok=True)
+        if not os.access(MEDIA_ROOT, os.W_OK):
+            raise PermissionError(f"MEDIA_ROOT is not writable: {MEDIA_ROOT}")
+
     def open(self, key: str) -> BinaryIO:
-        path = os.path.join(MEDIA_ROOT, key)
-        return open(path, "rb")
+        return open(self.path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        try:
+            return os.path.isfile(self.path(key))
+        except FileNotFoundError:
+            return False
+
+    def touch(self, key: str) -> bool:
+        try:
+            os.utime(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
 
     def delete(self, key: str) -> bool:
         try:
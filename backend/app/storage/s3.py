@@ -1,12 +1,20 @@
 import os
 import re
+import time
+import uuid
+import logging
+import threading
 import mimetypes
+from collections import OrderedDict
 from io import BytesIO
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Dict, Optional, Tuple
 import boto3
 from botocore.exceptions import ClientError
 from botocore.config import Config
-from .base import StorageBackend
+from boto3.s3.transfer import TransferConfig
+from .base import StorageBackend, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
 
 
 class S3Storage(StorageBackend):
@@ -24,10 +32,18 @@ class S3Storage(StorageBackend):
         self.public_endpoint_url = os.getenv("S3_PUBLIC_ENDPOINT_URL", self.endpoint_url)
         self.verify_ssl = os.getenv("SSL_VERIFY", "true").lower() not in ("false", "0", "no")
 
-        # Create boto3 client with optional custom endpoint
-        client_kwargs = {
+        # Concurrent calls via AsyncStorageBackend; each upload may use up to
+        # S3_UPLOAD_CONCURRENCY connections for multipart parts
+        self.max_concurrency = int(os.getenv("S3_MAX_CONCURRENCY", "16"))
+        self.upload_concurrency = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+
+        # boto3 client with optional custom endpoint - created on first use (see `s3`)
+        self._client_kwargs = client_kwargs = {
             "region_name": self.region,
-            "config": Config(signature_version='s3v4'),
+            "config": Config(
+                signature_version='s3v4',
+                max_pool_connections=self.max_concurrency * self.upload_concurrency,
+            ),
             "verify": self.verify_ssl
         }
 
@@ -38,11 +54,40 @@ class S3Storage(StorageBackend):
             client_kwargs["aws_access_key_id"] = self.access_key
             client_kwargs["aws_secret_access_key"] = self.secret_key
 
-        self.s3 = boto3.client("s3", **client_kwargs)
+        self._client = None
+        self._client_lock = threading.Lock()
         self.expires = int(os.getenv("S3_URL_EXPIRES", "900"))  # 15 min
 
-        # Ensure bucket exists (for MinIO)
-        self._ensure_bucket_exists()
+        # Presigned URLs are reused until `url_cache_margin` seconds before they expire
+        self.url_cache_margin = int(os.getenv("S3_URL_CACHE_MARGIN", "60"))
+        self.url_cache_size = int(os.getenv("S3_URL_CACHE_SIZE", "10000"))
+        self._url_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._url_cache_lock = threading.Lock()
+
+        # Multipart upload above the threshold, parts sent in parallel
+        self.transfer_config = TransferConfig(
+            multipart_threshold=int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024))),
+            multipart_chunksize=max(CHUNK_SIZE, 5 * 1024 * 1024),  # S3 minimum part size
+            max_concurrency=self.upload_concurrency,
+        )
+
+        self.ensure_bucket = os.getenv("S3_ENSURE_BUCKET", "true").lower() not in ("false", "0", "no")
+
+    @property
+    def s3(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client("s3", **self._client_kwargs)
+        return self._client
+
+    def warm(self) -> None:
+        """Create the client and open a pooled connection; raises if the bucket is unreachable."""
+        # Ensure bucket exists (for MinIO); every worker runs this, so it must
+        # tolerate another worker creating the bucket concurrently
+        if self.ensure_bucket:
+            self._ensure_bucket_exists()
+        self.s3.head_bucket(Bucket=self.bucket)
 
     def _sanitize(self, filename: str) -> str:
         name = os.path.basename(filename)
@@ -63,16 +108,27 @@ class S3Storage(StorageBackend):
                             Bucket=self.bucket,
                             CreateBucketConfiguration={"LocationConstraint": self.region}
                         )
-                except ClientError:
-                    pass  # Bucket may already exist or we don't have permissions
+                except ClientError as create_error:
+                    code = create_error.response.get("Error", {}).get("Code")
+                    if code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                        # No permission to create it - uploads will surface the real error
+                        logger.warning("Could not create bucket %s: %s", self.bucket, create_error)
 
     def save(self, fileobj: BinaryIO, filename: str) -> str:
-        key = self._sanitize(filename)
-        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-        fileobj.seek(0)
-        self.s3.put_object(Bucket=self.bucket, Key=key, Body=fileobj.read(), ContentType=content_type)
+        # Unikalny klucz jak przy presign: plik o tej samej nazwie nie nadpisuje
+        # cudzego oryginału (ani nie zostawia jego nieaktualnych miniatur)
+        key = self.new_upload_key(filename)
+        self.write(fileobj, key)
         return key
 
+    def write(self, fileobj: BinaryIO, key: str) -> None:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.s3.upload_fileobj(
+            fileobj, self.bucket, key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config,
+        )
+
     def open(self, key: str) -> BinaryIO:
         try:
             obj = self.s3.get_object(Bucket=self.bucket, Key=key)
@@ -84,20 +140,97 @@ class S3Storage(StorageBackend):
                 raise FileNotFoundError(key)
             raise
 
+    def exists(self, key: str) -> bool:
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def touch(self, key: str) -> bool:
+        # S3 has no "touch": copying the object onto itself (metadata replaced,
+        # which the API requires for a self-copy) sets a new LastModified
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        try:
+            self.s3.copy_object(
+                Bucket=self.bucket, Key=key,
+                CopySource={"Bucket": self.bucket, "Key": key},
+                MetadataDirective="REPLACE", ContentType=content_type,
+            )
+            return True
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
     def delete(self, key: str) -> bool:
         self.s3.delete_object(Bucket=self.bucket, Key=key)
+        with self._url_cache_lock:
+            self._url_cache.pop(key, None)
         return True
 
-    def get_file_url(self, key: str) -> Optional[str]:
-        # Generate presigned URL
+    def _public_url(self, url: str) -> str:
+        # If using MinIO with different public endpoint, replace the URL
+        if self.public_endpoint_url and self.endpoint_url and self.public_endpoint_url != self.endpoint_url:
+            url = url.replace(self.endpoint_url, self.public_endpoint_url)
+        return url
+
+    def _presign(self, key: str) -> str:
         url = self.s3.generate_presigned_url(
             "get_object",
             Params={"Bucket": self.bucket, "Key": key},
             ExpiresIn=self.expires,
         )
+        return self._public_url(url)
+
+    def new_upload_key(self, filename: str) -> str:
+        return f"{uuid.uuid4().hex}_{self._sanitize(filename)}"
+
+    def presign_upload(self, key: str, content_type: str, size: int, max_size: int, method: str = "POST") -> Dict:
+        """Presigned POST policy (or PUT URL) that lets the client upload `key` directly.
+
+        POST enforces the content type and a 1..max_size content-length range in the
+        policy; PUT signs the exact Content-Type and Content-Length instead.
+        """
+        if method == "PUT":
+            url = self.s3.generate_presigned_url(
+                "put_object",
+                Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type, "ContentLength": size},
+                ExpiresIn=self.expires,
+            )
+            return {"method": "PUT", "url": self._public_url(url), "fields": {}, "headers": {"Content-Type": content_type}}
+
+        post = self.s3.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_size]],
+            ExpiresIn=self.expires,
+        )
+        return {"method": "POST", "url": self._public_url(post["url"]), "fields": post["fields"], "headers": {}}
+
+    def get_cached_file_url(self, key: str) -> Tuple[str, int]:
+        """Return a presigned URL for `key` and the number of seconds it may still be reused."""
+        now = time.time()
+        with self._url_cache_lock:
+            entry = self._url_cache.get(key)
+            if entry is not None and entry[0] - self.url_cache_margin > now:
+                self._url_cache.move_to_end(key)
+                expires_at, url = entry
+                return url, int(expires_at - self.url_cache_margin - now)
+
+        url = self._presign(key)
+        expires_at = now + self.expires
+        with self._url_cache_lock:
+            self._url_cache[key] = (expires_at, url)
+            self._url_cache.move_to_end(key)
+            while len(self._url_cache) > self.url_cache_size:
+                self._url_cache.popitem(last=False)
+        return url, max(0, self.expires - self.url_cache_margin)
 
-        # If using MinIO with different public endpoint, replace the URL
-        if self.public_endpoint_url and self.endpoint_url and self.public_endpoint_url != self.endpoint_url:
-            url = url.replace(self.endpoint_url, self.public_endpoint_url)
-
-        return url
+    def get_file_url(self, key: str) -> Optional[str]:
+        return self.get_cached_file_url(key)[0]
@@ -0,0 +1,7 @@
+"""`app.main:app` z podmienioną autoryzacją - cel dla gunicorna w benchmarks.workers."""
+from app.auth import get_current_user
+from app.main import app
+
+from benchmarks.db_modes import USER_ID
+
+app.dependency_overrides[get_current_user] = lambda: {"sub": USER_ID}
@@ -0,0 +1,69 @@
+"""Benchmark: miniatury obrazów - oszczędność bajtów i przepustowość generowania.
+
+Dla zestawu syntetycznych zdjęć (szum + gradient, JPEG q=90) mierzy:
+  - rozmiar oryginału vs wariantu dla każdej szerokości z IMAGE_WIDTHS,
+  - przepustowość images.render w jednym procesie vs w puli procesów
+    (images/s łącznie i na rdzeń).
+
+    cd backend
+    python -m benchmarks.images --count 32 --size 3000x2000
+"""
+import argparse
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from app import images
+
+
+def _photo(width, height, seed):
+    noise = Image.effect_noise((width, height), 40 + seed % 20).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buf = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=32)
+    parser.add_argument("--size", default="3000x2000")
+    parser.add_argument("--width", type=int, default=400, help="szerokość dla pomiaru przepustowości")
+    parser.add_argument("--workers", type=int, default=images.IMAGE_WORKERS)
+    args = parser.parse_args()
+    w, h = (int(x) for x in args.size.split("x"))
+
+    originals = [_photo(w, h, i) for i in range(args.count)]
+    original_bytes = sum(map(len, originals)) / len(originals)
+
+    savings = []
+    for width in images.IMAGE_WIDTHS:
+        derived = len(images.render(originals[0], width))
+        savings.append({"width": width, "original_bytes": int(original_bytes), "derived_bytes": derived,
+                        "saved_pct": round(100 * (1 - derived / original_bytes), 1)})
+
+    start = time.perf_counter()
+    for data in originals:
+        images.render(data, args.width)
+    single = args.count / (time.perf_counter() - start)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(images.render, originals[:args.workers], [args.width] * args.workers))  # rozgrzewka
+        start = time.perf_counter()
+        list(pool.map(images.render, originals, [args.width] * args.count))
+        pooled = args.count / (time.perf_counter() - start)
+
+    print(f"originals: {args.count} x {w}x{h} JPEG, avg {original_bytes / 1024:.0f} KiB, format {images.IMAGE_FORMAT}")
+    for s in savings:
+        print(f"  w={s['width']:>4}: {s['derived_bytes'] / 1024:>7.1f} KiB  (-{s['saved_pct']}%)")
+    print(f"render w={args.width}: 1 process {single:.1f} img/s   "
+          f"{args.workers} workers {pooled:.1f} img/s ({pooled / args.workers:.1f} img/s per core)")
+    print(json.dumps({"savings": savings, "single_per_s": round(single, 2), "workers": args.workers,
+                      "pool_per_s": round(pooled, 2), "pool_per_core_per_s": round(pooled / args.workers, 2)}))
+
+
+if __name__ == "__main__":
+    main()
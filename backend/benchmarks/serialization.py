@@ -0,0 +1,89 @@
+"""Micro-benchmark: koszt serializacji listy todo na wiersz (10 / 1k / 10k wierszy).
+
+before: encje ORM -> walidacja TodoOut (from_attributes) -> jsonable_encoder -> json.dumps
+        (ścieżka FastAPI dla `response_model=list[TodoOut]`)
+after:  projekcja kolumn (crud.list_todos) -> rows_response (orjson, jeśli zainstalowany)
+
+    cd backend
+    python -m benchmarks.serialization --sizes 10 1000 10000
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud, schemas
+from app.database import Base
+from app.models import Todo
+from app.responses import orjson, rows_response
+
+USER_ID = "bench-user"
+
+
+def _before(db):
+    objs = db.query(Todo).filter(Todo.user_id == USER_ID).order_by(Todo.id.desc()).all()
+    validated = [schemas.TodoOut.model_validate(o) for o in objs]
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _after(db):
+    return rows_response(crud.list_todos(db, USER_ID)).body
+
+
+def _best(fn, db, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        db.expunge_all()
+        start = time.perf_counter()
+        fn(db)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.execute(insert(Todo), [
+            {"title": f"todo {i}", "description": "lorem ipsum " * 4, "due_date": date(2026, 1, 1),
+             "completed": i % 3 == 0, "image_key": f"{i}_image.png", "user_id": USER_ID}
+            for i in range(size)
+        ])
+        db.commit()
+
+        assert json.loads(_before(db)) == json.loads(_after(db))
+        before = _best(_before, db, args.repeat)
+        after = _best(_after, db, args.repeat)
+        results.append({
+            "rows": size,
+            "before_us_per_row": round(before / size * 1e6, 2),
+            "after_us_per_row": round(after / size * 1e6, 2),
+            "speedup": round(before / after, 2),
+        })
+        db.close()
+        engine.dispose()
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}")
+    for r in results:
+        print(f"{r['rows']:>6} rows: before {r['before_us_per_row']:>7} us/row   "
+              f"after {r['after_us_per_row']:>7} us/row   x{r['speedup']}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Load test: czy równoległe uploady podnoszą p99 GET /api/todos/.
+
+Dla każdego wariantu mierzy latencję GET /api/todos/ (stała liczba czytelników)
+najpierw bez obciążenia, potem przy `--uploaders` równoległych uploadach
+plików `--size-mb` MB:
+
+    blocking: storage.save wołane bezpośrednio w `async def upload_file`
+              (zachowanie sprzed AsyncStorageBackend - blokuje pętlę zdarzeń)
+    async:    AsyncStorageBackend (osobny, ograniczony executor)
+
+    cd backend
+    python -m benchmarks.uploads --readers 16 --uploaders 8 --size-mb 5 --duration 10
+
+Storage: LocalStorage w katalogu tymczasowym (albo S3, jeśli ustawiono S3_BUCKET_NAME).
+Zapis lokalny jest dławiony do `--storage-mbps` MB/s, żeby przypominał upload
+po sieci (0 = bez dławienia, sensowne dla prawdziwego S3).
+
+Cel: p50 i p99 w wariancie async nie rosną pod uploadami o więcej niż `--tolerance`
+(samo p99 jest przy wielu czytelnikach na 1 CPU zbyt zaszumione).
+Na końcu wypisywany jest werdykt. AsyncStorageBackend zdejmuje z pętli
+tylko zapis do storage. Odbiór ciała żądania, parsowanie multipart
+(python-multipart) i spooling do SpooledTemporaryFile robi Starlette na pętli
+zdarzeń, zanim trasa w ogóle się uruchomi. Na maszynie z 1-2 CPU (klient i
+serwer w jednym procesie) cel zwykle NIE jest osiągany.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.db_modes import USER_ID, _free_port, _percentile
+
+
+class _ThrottledReader:
+    def __init__(self, fileobj, mbps):
+        self._fileobj = fileobj
+        self._mbps = mbps
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        time.sleep(len(data) / (self._mbps * 1024 * 1024))
+        return data
+
+
+class _BlockingStorage:
+    """Async interfejs, ale wywołania synchroniczne na pętli zdarzeń (stare zachowanie)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def save(self, fileobj, filename):
+        return self.backend.save(fileobj, filename)
+
+    async def get_file_url(self, key):
+        return self.backend.get_file_url(key)
+
+
+async def _measure(base_url, readers, uploaders, size, duration):
+    import httpx
+
+    latencies, uploads = [], 0
+    payload = os.urandom(size)
+    deadline = time.perf_counter() + duration
+
+    async def reader(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            resp = await client.get("/api/todos/")
+            latencies.append(time.perf_counter() - start)
+            resp.raise_for_status()
+
+    async def uploader(client):
+        nonlocal uploads
+        while time.perf_counter() < deadline:
+            resp = await client.post("/api/files/", files={"file": ("bench.bin", payload, "application/octet-stream")})
+            resp.raise_for_status()
+            uploads += 1
+
+    limits = httpx.Limits(max_connections=readers + uploaders)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await asyncio.gather(*[reader(client) for _ in range(readers)],
+                             *[uploader(client) for _ in range(uploaders)])
+    return latencies, uploads
+
+
+def run_child(args):
+    import uvicorn
+    from app import crud, migrations, schemas
+    from app.auth import get_current_user
+    from app.database import SessionLocal, engine
+    from app.main import app
+    from app.routes import files
+
+    app.dependency_overrides[get_current_user] = lambda: {"sub": USER_ID}
+    if args.storage_mbps:
+        # Dławiony musi być właściwy backend: opakowania (InstrumentedStorage,
+        # ContentAddressedStorage) wołają inner.save, który woła self.write
+        raw = files.storage
+        while hasattr(raw, "inner"):
+            raw = raw.inner
+        write = raw.write
+        raw.write = lambda fileobj, key: write(_ThrottledReader(fileobj, args.storage_mbps), key)
+    if args.mode == "blocking":
+        files.astorage = _BlockingStorage(files.storage)
+
+    migrations.run(engine)
+    db = SessionLocal()
+    for i in range(args.seed):
+        crud.create_todo(db, schemas.TodoCreate(title=f"seed {i}"), USER_ID)
+    db.close()
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{port}"
+    size = int(args.size_mb * 1024 * 1024)
+    asyncio.run(_measure(base_url, args.readers, 0, size, 1))  # rozgrzewka
+    results = {"mode": args.mode}
+    for phase, uploaders in (("idle", 0), ("uploads", args.uploaders)):
+        latencies, uploads = asyncio.run(_measure(base_url, args.readers, uploaders, size, args.duration))
+        results[phase] = {
+            "requests": len(latencies),
+            "uploads": uploads,
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        }
+    server.should_exit = True
+    thread.join()
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--uploaders", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--storage-mbps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="sekundy na fazę")
+    parser.add_argument("--seed", type=int, default=100, help="liczba todo w bazie przed pomiarem")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="dopuszczalny wzrost p99 (0.1 = 10%%)")
+    parser.add_argument("--mode", choices=["blocking", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("blocking", "async"):
+            env = dict(os.environ, MEDIA_ROOT=tmp, TODO_CACHE_BACKEND="none")
+            env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench-{mode}.db")
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.uploads", "--mode", mode,
+                 "--readers", str(args.readers), "--uploaders", str(args.uploaders),
+                 "--size-mb", str(args.size_mb), "--storage-mbps", str(args.storage_mbps),
+                 "--duration", str(args.duration), "--seed", str(args.seed)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    for r in results:
+        idle, busy = r["idle"], r["uploads"]
+        print(f"{r['mode']:>8}: GET /api/todos/ p99 idle {idle['p99_ms']:>7} ms -> "
+              f"under uploads {busy['p99_ms']:>7} ms  ({busy['uploads']} uploads)")
+
+    idle, busy = results[-1]["idle"], results[-1]["uploads"]
+    growth = {q: busy[f"{q}_ms"] / idle[f"{q}_ms"] - 1 for q in ("p50", "p99")}
+    summary = ", ".join(f"{q} {g:+.0%}" for q, g in growth.items())
+    if max(growth.values()) <= args.tolerance:
+        print(f"goal met: async latency under uploads within {args.tolerance:.0%} of idle ({summary})")
+    else:
+        print(f"goal NOT met: async latency rises under uploads ({summary}); body receive, "
+              f"multipart parsing and spooling still run on the event loop")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Benchmark: skalowanie req/s z liczbą workerów gunicorna (WEB_CONCURRENCY=1..N).
+
+Dla każdej liczby workerów uruchamia `gunicorn -c gunicorn.conf.py` (tryb
+multiprocess metryk jak w kontenerze), zasila bazę i obciąża mieszanką
+odczytów GET /api/todos/ i GET /api/todos/{id} z `--clients` procesów
+klienckich (jeden proces httpx sam nie nasyci kilku workerów).
+Na koniec sprawdza, że /metrics sumuje żądania ze wszystkich workerów.
+
+    cd backend
+    python -m benchmarks.workers --workers 1 2 4 --requests 6000 --concurrency 64
+
+Bez DATABASE_URL używany jest plik SQLite w katalogu tymczasowym.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.db_modes import USER_ID, _free_port, _percentile
+
+
+async def _reads(base_url, total, concurrency, todo_ids):
+    import httpx
+
+    latencies = []
+    counter = iter(range(total))
+
+    async def worker(client):
+        for i in counter:
+            start = time.perf_counter()
+            if i % 2:
+                resp = await client.get("/api/todos/", params={"limit": 20})
+            else:
+                resp = await client.get(f"/api/todos/{todo_ids[i % len(todo_ids)]}")
+            latencies.append(time.perf_counter() - start)
+            resp.raise_for_status()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    return latencies
+
+
+def _client(args):
+    base_url, total, concurrency, todo_ids = args
+    start = time.perf_counter()
+    latencies = asyncio.run(_reads(base_url, total, concurrency, todo_ids))
+    return time.perf_counter() - start, latencies
+
+
+def _seed(count):
+    from app import crud, schemas
+    from app.database import SessionLocal, engine
+    from app import migrations
+
+    migrations.run(engine)
+    db = SessionLocal()
+    ids = [crud.create_todo(db, schemas.TodoCreate(title=f"seed {i}"), USER_ID).id for i in range(count)]
+    db.close()
+    return ids
+
+
+def _wait_ready(base_url, timeout=30):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def _run(workers, args, env, todo_ids):
+    import httpx
+
+    port = _free_port()
+    env = dict(env, WEB_CONCURRENCY=str(workers), BACKEND_HOST="127.0.0.1", BACKEND_PORT=str(port))
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "benchmarks._bench_app:app"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        _wait_ready(base_url)
+        per_client = args.requests // args.clients
+        jobs = [(base_url, per_client, max(1, args.concurrency // args.clients), todo_ids)] * args.clients
+        with ProcessPoolExecutor(args.clients) as pool:
+            list(pool.map(_client, [(base_url, 200, 8, todo_ids)] * args.clients))  # rozgrzewka
+            results = list(pool.map(_client, jobs))
+        elapsed = max(r[0] for r in results)
+        latencies = [l for r in results for l in r[1]]
+
+        metrics = httpx.get(base_url + "/metrics").text
+        served = sum(float(v) for v in re.findall(r'^http_requests_total\{[^}]*handler="/api/todos/[^"]*"[^}]*\} (\S+)',
+                                                   metrics, re.M))
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "metrics_requests_total": int(served),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=6000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="procesy generujące ruch")
+    parser.add_argument("--seed", type=int, default=200, help="liczba todo w bazie przed pomiarem")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, MEDIA_ROOT=tmp, PROMETHEUS_MULTIPROC_DIR=os.path.join(tmp, "metrics"))
+        env.setdefault("DATABASE_URL", f"sqlite:///{tmp}/bench.db")
+        os.environ["DATABASE_URL"] = env["DATABASE_URL"]
+        todo_ids = _seed(args.seed)
+        for workers in args.workers:
+            results.append(_run(workers, args, env, todo_ids))
+
+    base = results[0]["rps"]
+    for r in results:
+        print(f"{r['workers']:>2} workers: {r['rps']:>8} req/s (x{r['rps'] / base:.2f})   "
+              f"p50 {r['p50_ms']:>7} ms   p99 {r['p99_ms']:>7} ms   /metrics counted {r['metrics_requests_total']}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
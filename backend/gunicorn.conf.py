@@ -0,0 +1,36 @@
+"""Gunicorn + UvicornWorker: N workerów z jedną rejestracją metryk Prometheus.
+
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py app.main:app
+
+Każdy worker zapisuje metryki do plików w PROMETHEUS_MULTIPROC_DIR, a /metrics
+(dowolnego workera) agreguje je przez MultiProcessCollector. Zmienna musi być
+ustawiona, zanim którykolwiek proces zaimportuje prometheus_client.
+"""
+import os
+import glob
+
+multiproc_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+bind = f"{os.getenv('BACKEND_HOST', '0.0.0.0')}:{os.getenv('BACKEND_PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+# UvicornWorker bierze stąd timeout_keep_alive; domyślne 2 s gunicorna to mniej niż
+# idle timeout ALB (60 s), co kończy się 502 na ponownie użytych połączeniach
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+accesslog = "-" if os.getenv("ACCESS_LOG", "false").lower() in ("true", "1", "yes") else None
+
+
+def on_starting(server):
+    # Pliki z poprzedniego uruchomienia zawyżyłyby liczniki
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Gauge "live*" martwego workera nie powinny być dłużej sumowane
+    multiprocess.mark_process_dead(worker.pid)
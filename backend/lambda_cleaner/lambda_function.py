@@ -1,8 +1,11 @@
 import os
 import json
+import time
 import psycopg2
 import boto3
 import logging
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -19,8 +22,143 @@ DB_PASSWORD = os.environ["DB_PASSWORD"]
 S3_BUCKET = os.environ["S3_BUCKET"]
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
+# Rows deleted (and committed) per batch
+BATCH_SIZE = int(os.environ.get("CLEANER_BATCH_SIZE", "1000"))
+# Parallel S3 delete_objects calls (each up to 1000 keys)
+S3_DELETE_WORKERS = int(os.environ.get("CLEANER_S3_WORKERS", "8"))
+S3_DELETE_RETRIES = int(os.environ.get("CLEANER_S3_RETRIES", "3"))
+# Stop starting new batches when less than this much time is left
+TIME_MARGIN_MS = int(os.environ.get("CLEANER_TIME_MARGIN_MS", "30000"))
+# Tombstones (delta sync) older than this are pruned; clients with an older
+# sync token get 410 and reload the full list
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get("CLEANER_TOMBSTONE_RETENTION_DAYS", "30"))
+
+S3_CHUNK = 1000  # delete_objects limit
+
+# Image derivatives (app/images.py) are stored as "<original>.w<width>.<format>"
+# and are deleted together with their original. Widths mirror the API's
+# IMAGE_WIDTHS; every derivative format is listed so a changed
+# IMAGE_DERIVATIVE_FORMAT leaves nothing behind (deleting a missing key is a
+# no-op). Anything outside this list is left for the orphan reconcile.
+IMAGE_WIDTHS = [int(w) for w in os.environ.get("IMAGE_WIDTHS", "64,128,200,400,800").split(",") if w.strip()]
+DERIVED_FORMATS = ("webp", "jpeg", "png")
+RESIZABLE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp")
+
 s3 = boto3.client("s3", region_name=AWS_REGION)
 
+# A batch runs in three statements in one transaction. Like the API
+# (app/crud.py) it bumps each affected user's sync version and leaves
+# tombstones, so clients doing delta sync (GET /api/todos/changes) see these
+# deletions too. Lock order matches the API - the users' todo_sync_state rows
+# first (sorted by user_id), then their todos - so the two cannot deadlock.
+#
+# Users owning the next batch of completed todos; read without locks.
+BATCH_USERS_SQL = """
+    SELECT DISTINCT user_id FROM (
+        SELECT user_id FROM todos
+        WHERE completed = TRUE
+        ORDER BY id
+        LIMIT %s
+    ) batch
+"""
+
+# Locks (and bumps) the sync state of those users in user_id order.
+BUMP_VERSIONS_SQL = """
+    INSERT INTO todo_sync_state (user_id, version, pruned_version)
+    SELECT user_id, 1, 0 FROM unnest(%s::varchar[]) AS u(user_id)
+    ORDER BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET version = todo_sync_state.version + 1
+    RETURNING user_id, version
+"""
+
+# Deletes the batch of those users' completed todos and returns their image
+# keys. SKIP LOCKED lets overlapping invocations work on different rows; the
+# LIMIT keeps each transaction (and its row locks) short.
+DELETE_BATCH_SQL = """
+    WITH deleted AS (
+        DELETE FROM todos
+        WHERE id IN (
+            SELECT id FROM todos
+            WHERE completed = TRUE AND user_id = ANY(%s)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, image_key
+    ), tombstones AS (
+        INSERT INTO todo_tombstones (user_id, todo_id, version, deleted_at)
+        SELECT d.user_id, d.id, v.version, now()
+        FROM deleted d
+        JOIN unnest(%s::varchar[], %s::bigint[]) AS v(user_id, version) USING (user_id)
+    )
+    SELECT id, image_key FROM deleted
+"""
+
+# Drops expired tombstones and records the highest pruned version per user;
+# sync tokens at or below it can no longer be answered.
+PRUNE_TOMBSTONES_SQL = """
+    WITH pruned AS (
+        DELETE FROM todo_tombstones
+        WHERE deleted_at < now() - make_interval(days => %s)
+        RETURNING user_id, version
+    )
+    UPDATE todo_sync_state s
+    SET pruned_version = GREATEST(s.pruned_version, p.version)
+    FROM (SELECT user_id, MAX(version) AS version FROM pruned GROUP BY user_id) p
+    WHERE s.user_id = p.user_id
+"""
+
+# Keys still used by remaining todos (content-addressed storage shares one
+# object between todos) must survive the batch.
+STILL_REFERENCED_SQL = "SELECT DISTINCT image_key FROM todos WHERE image_key = ANY(%s)"
+
+
+def _delete_chunk(keys):
+    """Deletes up to 1000 keys, retrying the per-key `Errors` from S3.
+
+    Returns (deleted, failed_keys).
+    """
+    pending = keys
+    for attempt in range(S3_DELETE_RETRIES + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt * 0.1, 2))
+        resp = s3.delete_objects(
+            Bucket=S3_BUCKET,
+            Delete={"Objects": [{"Key": k} for k in pending], "Quiet": True},
+        )
+        # Quiet mode only reports failures
+        errors = resp.get("Errors", [])
+        if not errors:
+            return len(keys), []
+        logger.warning(
+            f"S3 delete attempt {attempt + 1}: {len(errors)} errors "
+            f"(first: {errors[0].get('Code')} {errors[0].get('Message')})"
+        )
+        pending = [e["Key"] for e in errors]
+    return len(keys) - len(pending), pending
+
+
+def derived_keys(key):
+    if (mimetypes.guess_type(key)[0] or "") not in RESIZABLE_TYPES:
+        return []
+    return [f"{key}.w{width}.{fmt}" for width in IMAGE_WIDTHS for fmt in DERIVED_FORMATS]
+
+
+def delete_s3_keys(pool, keys):
+    chunks = [keys[i : i + S3_CHUNK] for i in range(0, len(keys), S3_CHUNK)]
+    deleted = 0
+    failed = []
+    for chunk_deleted, chunk_failed in pool.map(_delete_chunk, chunks):
+        deleted += chunk_deleted
+        failed.extend(chunk_failed)
+    return deleted, failed
+
+
+def _time_left_ms(context):
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return float("inf")
+    return context.get_remaining_time_in_millis()
+
 
 def lambda_handler(event, context):
     logger.info("=== Lambda execution started ===")
@@ -30,8 +168,15 @@ def lambda_handler(event, context):
     logger.info(f"Function name: {context.function_name}")
     logger.info(f"Memory limit: {context.memory_limit_in_mb} MB")
 
+    if event.get("mode") == "reconcile":
+        import reconcile
+        return reconcile.run_lambda(event, context)
+
     deleted_todos = 0
     deleted_files = 0
+    failed_files = []
+    batches = 0
+    finished = False
 
     logger.info(
         f"Connecting to RDS: host={DB_HOST}, db={DB_NAME}, user={DB_USER}"
@@ -52,57 +197,68 @@ def lambda_handler(event, context):
 
     try:
         with conn.cursor() as cur:
-            logger.info("Fetching todos marked as completed...")
-
-            cur.execute("SELECT id, image_key FROM todos WHERE completed = TRUE")
-            rows = cur.fetchall()
-
-            logger.info(f"Found {len(rows)} completed todos.")
-
-            todo_ids = [r[0] for r in rows]
-            image_keys = [r[1] for r in rows if r[1] is not None]
-
-            logger.info(f"Todo IDs to delete: {todo_ids}")
-            logger.info(f"S3 keys to delete: {image_keys}")
+            cur.execute(PRUNE_TOMBSTONES_SQL, (TOMBSTONE_RETENTION_DAYS,))
+            pruned_users = cur.rowcount
+        conn.commit()
+        logger.info(f"Pruned tombstones older than {TOMBSTONE_RETENTION_DAYS} days for {pruned_users} users")
 
-            if todo_ids:
-                cur.execute("DELETE FROM todos WHERE id = ANY(%s)", (todo_ids,))
-                deleted_todos = cur.rowcount
-                logger.info(f"Deleted {deleted_todos} todos from the database.")
-            else:
-                logger.info("No todos to delete.")
+        with ThreadPoolExecutor(max_workers=S3_DELETE_WORKERS) as pool:
+            while True:
+                if _time_left_ms(context) < TIME_MARGIN_MS:
+                    logger.info("Time budget exhausted; remaining todos are left for the next invocation.")
+                    break
 
-            if image_keys:
-                objects = [{"Key": key} for key in image_keys]
+                with conn.cursor() as cur:
+                    cur.execute(BATCH_USERS_SQL, (BATCH_SIZE,))
+                    user_ids = sorted(r[0] for r in cur.fetchall())
+                    rows = []
+                    if user_ids:
+                        cur.execute(BUMP_VERSIONS_SQL, (user_ids,))
+                        versions = dict(cur.fetchall())
+                        cur.execute(
+                            DELETE_BATCH_SQL,
+                            (user_ids, BATCH_SIZE, list(versions), list(versions.values())),
+                        )
+                        rows = cur.fetchall()
 
-                logger.info(f"Deleting {len(objects)} objects from S3...")
+                    if not rows:
+                        conn.rollback()
+                        finished = True
+                        break
 
-                for i in range(0, len(objects), 1000):
-                    chunk = objects[i : i + 1000]
-                    logger.info(f"Deleting S3 chunk of size {len(chunk)}")
+                    image_keys = list(dict.fromkeys(r[1] for r in rows if r[1] is not None))
+                    if image_keys:
+                        cur.execute(STILL_REFERENCED_SQL, (image_keys,))
+                        referenced = {r[0] for r in cur.fetchall()}
+                        image_keys = [k for k in image_keys if k not in referenced]
+                    image_keys += [d for k in image_keys for d in derived_keys(k)]
 
-                    try:
-                        resp = s3.delete_objects(
-                            Bucket=S3_BUCKET,
-                            Delete={"Objects": chunk, "Quiet": True},
-                        )
-                        deleted_count = len(resp.get("Deleted", []))
-                        deleted_files += deleted_count
+                # Rows first: once committed no todo references these keys. A key
+                # whose S3 delete fails is only an orphan, which the reconcile
+                # mode removes later; the reverse order could leave todos
+                # pointing at deleted files if the commit failed.
+                conn.commit()
+                batches += 1
+                deleted_todos += len(rows)
 
-                        logger.info(
-                            f"S3 deletion response: deleted={deleted_count}, "
-                            f"errors={resp.get('Errors', [])}"
-                        )
-                    except Exception as e:
-                        logger.error("S3 deletion failed!")
-                        logger.exception(e)
-                        raise
+                try:
+                    batch_deleted, batch_failed = delete_s3_keys(pool, image_keys)
+                except Exception as e:
+                    logger.error("S3 deletion failed; keys are left for the orphan reconcile.")
+                    logger.exception(e)
+                    batch_deleted, batch_failed = 0, image_keys
+                deleted_files += batch_deleted
+                failed_files.extend(batch_failed)
 
-            else:
-                logger.info("No S3 files to delete.")
+                logger.info(
+                    f"Batch {batches}: deleted {len(rows)} todos, "
+                    f"{batch_deleted}/{len(image_keys)} files (incl. derivatives)"
+                    + (f", {len(batch_failed)} files failed" if batch_failed else "")
+                )
 
-        conn.commit()
-        logger.info("Database commit successful.")
+                if len(rows) < BATCH_SIZE:
+                    finished = True
+                    break
 
     except Exception as e:
         logger.error("Error inside main try block:")
@@ -113,9 +269,16 @@ def lambda_handler(event, context):
         conn.close()
         logger.info("Database connection closed.")
 
+    if failed_files:
+        logger.warning(
+            f"{len(failed_files)} S3 objects could not be deleted and are left for the "
+            f"orphan reconcile (sample: {failed_files[:10]})"
+        )
+
     logger.info(
         f"=== Lambda execution completed === "
-        f"Deleted todos: {deleted_todos}, Deleted files: {deleted_files}"
+        f"Deleted todos: {deleted_todos}, Deleted files: {deleted_files}, "
+        f"Batches: {batches}, Finished: {finished}"
     )
 
     return {
@@ -124,6 +287,9 @@ def lambda_handler(event, context):
             {
                 "deleted_todos": deleted_todos,
                 "deleted_files": deleted_files,
+                "failed_files": len(failed_files),
+                "batches": batches,
+                "finished": finished,
             }
         ),
     }
@@ -0,0 +1,249 @@
+"""Orphaned-object reconciliation: deletes uploads no Todo.image_key points to.
+
+Both sides are streamed in the same (byte-wise) key order - S3 ListObjectsV2
+returns keys sorted, and Postgres sorts with COLLATE "C" through a server-side
+cursor - so the difference is a single merge pass with constant memory,
+whatever the number of keys. Objects younger than the grace period are never
+touched (uploads in flight, todos created after the DB snapshot).
+
+Lambda: invoke `lambda_function.lambda_handler` with
+    {"mode": "reconcile", "dry_run": true, "grace_hours": 24, "start_after": "<key>"}
+
+LocalStorage (MEDIA_ROOT) from the command line:
+    python reconcile.py --media-root /app/uploads --dry-run
+"""
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+logger = logging.getLogger()
+
+GRACE_HOURS = float(os.environ.get("RECONCILE_GRACE_HOURS", "24"))
+REPORT_SAMPLE = 100
+DB_FETCH_SIZE = 10000
+# Image derivatives (app/images.py) are stored as "<original>.w<width>.<format>"
+DERIVED_KEY_RE = re.compile(r"^(?P<key>.+)\.w\d+\.(?:webp|jpeg|png)$")
+
+REFERENCED_KEYS_SQL = """
+    SELECT DISTINCT image_key COLLATE "C" AS k FROM todos
+    WHERE image_key IS NOT NULL AND image_key COLLATE "C" > %s
+    ORDER BY k
+"""
+
+
+def iter_referenced_keys(conn, start_after=""):
+    with conn.cursor(name="referenced_keys") as cur:
+        cur.itersize = DB_FETCH_SIZE
+        cur.execute(REFERENCED_KEYS_SQL, (start_after,))
+        for (key,) in cur:
+            yield key
+
+
+def iter_s3_objects(s3, bucket, start_after=""):
+    """Yields (key, last_modified_ts, size) in key order."""
+    paginator = s3.get_paginator("list_objects_v2")
+    kwargs = {"Bucket": bucket}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    for page in paginator.paginate(**kwargs):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["LastModified"].timestamp(), obj["Size"]
+
+
+def iter_local_objects(root, start_after=""):
+    # scandir has no ordering guarantee; names are sorted (the one in-memory step)
+    names = sorted(e.name for e in os.scandir(root) if e.is_file() and e.name > start_after)
+    for name in names:
+        try:
+            st = os.stat(os.path.join(root, name))
+        except FileNotFoundError:
+            continue
+        yield name, st.st_mtime, st.st_size
+
+
+def find_orphans(stored, referenced, cutoff_ts, stop=lambda: False):
+    """Merge two key-sorted streams; yields stored objects that are not referenced.
+
+    `stored` yields (key, mtime, size), `referenced` yields keys. Objects modified
+    after `cutoff_ts` are skipped. Both streams are consumed lazily.
+
+    A derived image key counts as referenced when its original is. It sorts
+    after the original, so the already consumed references that are still a
+    prefix of the current key are kept on a (short) stack.
+
+    `stop()` is asked before a key only while that stack is empty: a pass
+    resumed after the previous key re-reads every reference it still needs.
+    Stopping inside a prefix run (derivatives, or any key sorting between an
+    original and its derivatives) would lose the reference to the original.
+    """
+    ref = next(referenced, None)
+    prefixes = []
+    for key, mtime, size in stored:
+        while ref is not None and ref < key:
+            prefixes.append(ref)
+            ref = next(referenced, None)
+        while prefixes and not key.startswith(prefixes[-1]):
+            prefixes.pop()
+        if not prefixes and stop():
+            return
+        if ref == key or mtime > cutoff_ts:
+            continue
+        derived = DERIVED_KEY_RE.match(key)
+        if derived and derived.group("key") in prefixes:
+            continue
+        yield key, mtime, size
+
+
+class Report:
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.orphans = 0
+        self.orphan_bytes = 0
+        self.deleted = 0
+        self.failed = 0
+        self.sample = []
+        self.last_key = ""
+        self.finished = False
+
+    def as_dict(self):
+        return {
+            "mode": "reconcile",
+            "dry_run": self.dry_run,
+            "orphans": self.orphans,
+            "orphan_bytes": self.orphan_bytes,
+            "deleted": self.deleted,
+            "failed": self.failed,
+            "sample": self.sample,
+            "finished": self.finished,
+            "next_start_after": None if self.finished else self.last_key,
+        }
+
+
+def reconcile(stored, referenced, delete_batch, dry_run=True, grace_hours=GRACE_HOURS,
+              batch_size=1000, workers=8, time_left_ms=lambda: float("inf"), time_margin_ms=30000):
+    """Runs one reconciliation pass; `delete_batch(keys)` returns (deleted, failed_keys).
+
+    The time budget is checked before every listed key outside a referenced
+    prefix run (see `find_orphans`), so a long run of referenced keys cannot
+    overrun it; `last_key` is the last key fully handled, derivatives
+    included, and is where the next pass resumes.
+    """
+    report = Report(dry_run)
+    cutoff = time.time() - grace_hours * 3600
+    batch = []
+    in_flight = []
+    stopped = False
+
+    def scanned():
+        for obj in stored:
+            yield obj
+            # Asked for the next key: this one (and its orphan, if any) is done
+            report.last_key = obj[0]
+
+    def out_of_time():
+        nonlocal stopped
+        stopped = time_left_ms() < time_margin_ms
+        return stopped
+
+    def collect(limit):
+        while len(in_flight) > limit:
+            deleted, failed = in_flight.pop(0).result()
+            report.deleted += deleted
+            report.failed += len(failed)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for key, _mtime, size in find_orphans(scanned(), referenced, cutoff, out_of_time):
+            report.orphans += 1
+            report.orphan_bytes += size
+            if len(report.sample) < REPORT_SAMPLE:
+                report.sample.append(key)
+            if not dry_run:
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    in_flight.append(pool.submit(delete_batch, batch))
+                    batch = []
+                    collect(workers * 2)
+        if batch:
+            in_flight.append(pool.submit(delete_batch, batch))
+        collect(0)
+        report.finished = not stopped
+
+    return report
+
+
+def run_lambda(event, context):
+    """`mode: reconcile` of the cleaner Lambda (S3 bucket vs. Postgres)."""
+    import lambda_function as lf
+
+    dry_run = bool(event.get("dry_run", True))
+    start_after = event.get("start_after") or ""
+    conn = psycopg2.connect(host=lf.DB_HOST, dbname=lf.DB_NAME, user=lf.DB_USER, password=lf.DB_PASSWORD)
+    try:
+        report = reconcile(
+            iter_s3_objects(lf.s3, lf.S3_BUCKET, start_after),
+            iter_referenced_keys(conn, start_after),
+            lf._delete_chunk,
+            dry_run=dry_run,
+            grace_hours=float(event.get("grace_hours", GRACE_HOURS)),
+            batch_size=lf.S3_CHUNK,
+            workers=lf.S3_DELETE_WORKERS,
+            time_left_ms=lambda: lf._time_left_ms(context),
+            time_margin_ms=lf.TIME_MARGIN_MS,
+        )
+    finally:
+        conn.close()
+
+    result = report.as_dict()
+    logger.info(f"Reconciliation finished: {json.dumps({k: v for k, v in result.items() if k != 'sample'})}")
+    return {"statusCode": 200, "body": json.dumps(result)}
+
+
+def _delete_local(root):
+    def delete_batch(keys):
+        failed = []
+        for key in keys:
+            try:
+                os.remove(os.path.join(root, key))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                failed.append(key)
+        return len(keys) - len(failed), failed
+    return delete_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--media-root", default=os.environ.get("MEDIA_ROOT", "/app/uploads"))
+    parser.add_argument("--grace-hours", type=float, default=GRACE_HOURS)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        dbname=os.environ["DB_NAME"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+    )
+    try:
+        report = reconcile(
+            iter_local_objects(args.media_root),
+            iter_referenced_keys(conn),
+            _delete_local(args.media_root),
+            dry_run=args.dry_run,
+            grace_hours=args.grace_hours,
+        )
+    finally:
+        conn.close()
+    print(json.dumps(report.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+
+# Przed importem aplikacji: konfiguracja czytana jest przy imporcie modułów
+_tmp = tempfile.mkdtemp(prefix="todo-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["MEDIA_ROOT"] = os.path.join(_tmp, "media")
+os.environ["TODO_CACHE_BACKEND"] = "memory"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ.pop("S3_BUCKET_NAME", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import migrations
+from app.auth import get_current_user
+from app.database import SessionLocal, engine
+from app.main import app
+
+USER_ID = "test-user"
+
+migrations.run(engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    app.dependency_overrides[get_current_user] = lambda: {"sub": USER_ID}
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
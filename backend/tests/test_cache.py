@@ -0,0 +1,60 @@
+from sqlalchemy import delete
+
+from app import crud, schemas
+from app.models import Todo
+from app.cache import todo_cache
+
+from .conftest import USER_ID
+
+
+def test_read_after_write_is_fresh(client):
+    todo = client.post("/api/todos/", json={"title": "fresh"}).json()
+    # Rozgrzej cache listy i pojedynczego todo
+    assert not client.get(f"/api/todos/{todo['id']}").json()["completed"]
+    assert todo["id"] in [t["id"] for t in client.get("/api/todos/").json()]
+
+    client.post(f"/api/todos/{todo['id']}/complete")
+
+    assert client.get(f"/api/todos/{todo['id']}").json()["completed"]
+    listed = {t["id"]: t for t in client.get("/api/todos/").json()}
+    assert listed[todo["id"]]["completed"]
+
+    client.post("/api/todos/bulk/delete", json={"ids": [todo["id"]]})
+
+    assert client.get(f"/api/todos/{todo['id']}").status_code == 404
+    assert todo["id"] not in [t["id"] for t in client.get("/api/todos/").json()]
+
+
+def test_set_after_concurrent_write_is_not_served(db):
+    todo = crud.create_todo(db, schemas.TodoCreate(title="race"), USER_ID)
+    params = schemas.TodoListParams()
+
+    # Odczyt: chybienie w cache, zapytanie do bazy...
+    item_key = todo_cache.item_key(USER_ID, todo.id)
+    list_key = crud._list_key(USER_ID, params, None)
+    assert todo_cache.get(item_key) is None and todo_cache.get(list_key) is None
+    stale_item = db.execute(crud._get_stmt(todo.id, USER_ID)).first()
+    stale_page = crud._page(db.execute(crud._list_stmt(USER_ID, params)).all(), params.limit)
+
+    # ...w tym czasie zapis commituje i unieważnia cache...
+    crud.toggle_done(db, todo.id, True, USER_ID)
+
+    # ...a dopiero potem odczyt zapisuje swój (już nieaktualny) wynik
+    todo_cache.set(item_key, stale_item)
+    todo_cache.set(list_key, stale_page)
+
+    assert crud.get_todo(db, todo.id, USER_ID).completed
+    rows, _ = crud.list_todos_page(db, USER_ID, params)
+    assert {row.id: row for row in rows}[todo.id].completed
+
+
+def test_list_reflects_write_from_another_process(client, db):
+    todo = client.post("/api/todos/", json={"title": "cleaned"}).json()
+    assert todo["id"] in [t["id"] for t in client.get("/api/todos/").json()]
+
+    # Jak Lambda cleaner: usuwa wiersz i podbija wersję z pominięciem cache API
+    db.execute(delete(Todo).where(Todo.id == todo["id"]))
+    crud._next_version(db, USER_ID)
+    db.commit()
+
+    assert todo["id"] not in [t["id"] for t in client.get("/api/todos/").json()]
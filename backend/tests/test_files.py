@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+from starlette.requests import Request
+
+from app.main import app
+from app.routes import files
+
+
+def _no_form_parsing(monkeypatch):
+    # Formularz za dużego żądania nie może być parsowany (ani buforowany na dysk)
+    async def fail(*args, **kwargs):
+        raise AssertionError("oversized body was parsed")
+    monkeypatch.setattr(Request, "_get_form", fail)
+
+
+def _multipart(size: int):
+    boundary = "test-boundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.bin\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode()
+    return boundary, head + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+
+
+def test_oversized_upload_rejected_by_content_length(client, monkeypatch):
+    monkeypatch.setattr(files, "MAX_UPLOAD_SIZE", 1024)
+    _no_form_parsing(monkeypatch)
+
+    resp = client.post("/api/files/", files={"file": ("big.bin", b"x" * 256 * 1024)})
+    assert resp.status_code == 413
+
+
+def test_oversized_chunked_upload_rejected_while_receiving(client, monkeypatch):
+    monkeypatch.setattr(files, "MAX_UPLOAD_SIZE", 1024)
+    boundary, body = _multipart(256 * 1024)
+    sent = []
+
+    async def chunks():
+        for i in range(0, len(body), 16 * 1024):
+            sent.append(i)
+            yield body[i:i + 16 * 1024]
+
+    async def post():
+        # ASGITransport podaje ciało aplikacji leniwie (TestClient czyta je całe z góry);
+        # generator -> Transfer-Encoding: chunked, bez Content-Length
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            return await c.post("/api/files/", content=chunks(),
+                                headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    assert asyncio.run(post()).status_code == 413
+    # Odbiór przerwany zaraz po przekroczeniu limitu, nie po całym ciele
+    assert len(sent) * 16 * 1024 < len(body) // 2
+
+
+def test_upload_within_limit(client, monkeypatch):
+    monkeypatch.setattr(files, "MAX_UPLOAD_SIZE", 1024)
+
+    resp = client.post("/api/files/", files={"file": ("small.txt", b"x" * 1000)})
+    assert resp.status_code == 200
@@ -0,0 +1,37 @@
+import struct
+import zlib
+
+import io
+import warnings
+
+import pytest
+from PIL import Image
+
+from app import images
+
+
+def _png_header(width: int, height: int) -> bytes:
+    """PNG z samym nagłówkiem: wymiary deklarowane, pikseli prawie brak."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr)
+            + chunk(b"IDAT", zlib.compress(b"\x00" * 64)) + chunk(b"IEND", b""))
+
+
+def test_decompression_bomb_is_not_resized(client):
+    bomb = _png_header(100000, 100000)  # 10^10 pikseli: DecompressionBombError
+    key = client.post("/api/files/", files={"file": ("bomb.png", bomb, "image/png")}).json()["key"]
+
+    assert client.get(f"/api/files/{key}", params={"w": 64}).status_code == 415
+
+
+def test_decompression_bomb_warning_is_an_error(monkeypatch):
+    # Między MAX_IMAGE_PIXELS a 2x Pillow domyślnie tylko ostrzega i dekoduje obraz
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 5000)
+    data = io.BytesIO()
+    Image.new("RGB", (80, 80)).save(data, format="PNG")
+
+    with warnings.catch_warnings(), pytest.raises(Image.DecompressionBombWarning):
+        warnings.simplefilter("ignore")
+        images.render(data.getvalue(), 64)
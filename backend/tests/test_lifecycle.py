@@ -0,0 +1,27 @@
+import asyncio
+import os
+import signal
+
+from app import lifecycle
+
+
+def test_sigterm_drains_before_shutdown(monkeypatch):
+    monkeypatch.setattr(lifecycle, "SHUTDOWN_DRAIN_SECONDS", 0.05)
+    monkeypatch.setattr(lifecycle.readiness, "shutting_down", False)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        # W miejscu handlera uvicorna: SIGINT oznacza właściwe zamknięcie
+        loop.add_signal_handler(signal.SIGINT, stopped.set)
+        lifecycle.install_drain_handler()
+        try:
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.sleep(0.01)
+            assert lifecycle.readiness.shutting_down and not stopped.is_set()
+            await asyncio.wait_for(stopped.wait(), 1)
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            loop.remove_signal_handler(signal.SIGINT)
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import migrations, schemas
+from app.consistency import get_primary_db, get_read_db
+from app.database import SessionLocal
+from app.main import app
+
+
+def test_overdue_etag_changes_with_the_day(client, monkeypatch):
+    client.post("/api/todos/", json={"title": "due", "due_date": "2026-01-01"})
+    etag = client.get("/api/todos/?overdue=true").headers["ETag"]
+    assert client.get("/api/todos/?overdue=true", headers={"If-None-Match": etag}).status_code == 304
+
+    class Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.fromordinal(date.today().toordinal() + 1)
+
+    # Po północy te same dane i wersja, ale inna granica "overdue"
+    monkeypatch.setattr(schemas, "date", Tomorrow)
+    assert client.get("/api/todos/?overdue=true", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_due_date_round_trip(client):
+    todo = client.post("/api/todos/", json={"title": "dated", "due_date": "2026-03-04"}).json()
+    assert todo["due_date"] == "2026-03-04"
+    assert client.get(f"/api/todos/{todo['id']}").json()["due_date"] == "2026-03-04"
+    listed = {t["id"]: t for t in client.get("/api/todos/").json()}
+    assert listed[todo["id"]]["due_date"] == "2026-03-04"
+
+
+def test_sync_state_is_read_from_primary_when_replica_lags(client, tmp_path):
+    # Replika bez żadnych danych = maksymalne opóźnienie replikacji
+    replica_engine = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    migrations.run(replica_engine)
+    Replica = sessionmaker(bind=replica_engine)
+
+    def replica_db():
+        with Replica() as db:
+            yield db
+
+    def primary_db():
+        with SessionLocal() as db:
+            yield db
+
+    token = client.get("/api/todos/").headers["X-Sync-Token"]
+    todo = client.post("/api/todos/", json={"title": "fresh"}).json()
+    app.dependency_overrides[get_read_db] = replica_db
+    app.dependency_overrides[get_primary_db] = primary_db
+    try:
+        listed = client.get("/api/todos/")
+        assert todo["id"] in [t["id"] for t in listed.json()]
+        # Token nowszy niż stan repliki nie może dać fałszywego 410
+        fresh = client.get("/api/todos/changes", params={"since": listed.headers["X-Sync-Token"]})
+        assert fresh.status_code == 200 and fresh.json()["changed"] == []
+        delta = client.get("/api/todos/changes", params={"since": token})
+        assert delta.status_code == 200
+        assert [t["id"] for t in delta.json()["changed"]] == [todo["id"]]
+    finally:
+        replica_engine.dispose()
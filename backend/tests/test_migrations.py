@@ -0,0 +1,37 @@
+from datetime import date
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+
+_LEGACY_TODOS = """
+    CREATE TABLE todos (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, description TEXT,
+                        due_date VARCHAR(32), completed BOOLEAN, image_key VARCHAR(512),
+                        user_id VARCHAR(36) NOT NULL)
+"""
+
+
+def _due_on(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT title, due_on FROM todos")).all())
+
+
+def test_due_date_expand_backfill_contract(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        conn.execute(text(_LEGACY_TODOS))
+        conn.execute(text("INSERT INTO todos (title, due_date, user_id) VALUES "
+                          "('valid', '2026-01-02', 'u'), ('junk', 'someday', 'u'), ('none', NULL, 'u')"))
+
+    # Start nowej wersji: kolumna due_on dołożona i wypełniona, stara zostaje
+    migrations.run(engine)
+    assert _due_on(engine) == {"valid": "2026-01-02", "junk": None, "none": None}
+    assert "due_date" in [c["name"] for c in inspect(engine).get_columns("todos")]
+
+    # Stary pod w trakcie wdrożenia zapisuje jeszcze tekstowy termin
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO todos (title, due_date, user_id) VALUES ('old pod', '2026-05-06', 'u')"))
+
+    migrations.contract_due_date(engine)
+    assert _due_on(engine)["old pod"] == date(2026, 5, 6).isoformat()
+    assert "due_date" not in [c["name"] for c in inspect(engine).get_columns("todos")]
@@ -0,0 +1,23 @@
+from lambda_cleaner.reconcile import reconcile
+
+OLD = 0.0
+# Posortowane bajtowo jak ListObjectsV2; "a.jpg-x" wypada między oryginałem a jego pochodnymi
+STORED = ["a.jpg", "a.jpg-x", "a.jpg.w128.webp", "a.jpg.w64.webp", "b.jpg", "b.jpg.w64.webp"]
+REFERENCED = ["a.jpg"]
+
+
+def _pass(start_after, time_left_ms):
+    stored = ((k, OLD, 1) for k in STORED if k > start_after)
+    referenced = (k for k in REFERENCED if k > start_after)
+    return reconcile(stored, referenced, None, time_left_ms=time_left_ms, time_margin_ms=0)
+
+
+def test_budget_expiring_inside_derivative_run_resumes_safely():
+    checks = iter([1, -1])
+    first = _pass("", lambda: next(checks, -1))
+    assert not first.finished
+    # Budżet kończy się w serii kluczy "a.jpg..." - przerwanie przy "a.jpg-x" zgubiłoby referencję do "a.jpg"
+    assert first.last_key == "a.jpg.w64.webp"
+    second = _pass(first.as_dict()["next_start_after"], lambda: float("inf"))
+    assert second.finished
+    assert first.sample + second.sample == ["a.jpg-x", "b.jpg", "b.jpg.w64.webp"]
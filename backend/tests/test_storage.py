@@ -0,0 +1,18 @@
+import io
+import os
+import time
+
+from app.storage.dedup import ContentAddressedStorage
+from app.storage.local import LocalStorage
+
+
+def test_dedup_hit_refreshes_mtime():
+    storage = ContentAddressedStorage(LocalStorage())
+    key = storage.save(io.BytesIO(b"same content"), "a.png")
+    old = time.time() - 7 * 24 * 3600
+    os.utime(storage.path(key), (old, old))
+
+    # Drugi upload tych samych bajtów nie zapisuje pliku, ale odświeża mtime,
+    # więc okres karencji reconcile liczy się od nowego uploadu
+    assert storage.save(io.BytesIO(b"same content"), "b.png") == key
+    assert os.path.getmtime(storage.path(key)) > old + 3600
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import './App.css';
-import { createTodo, listTodos, markComplete, uploadFile, fileUrl, isImageKey } from './api';
+import { createTodo, listTodos, markComplete, searchTodos, uploadFile, fileUrl, isImageKey } from './api';
 import type {Todo, TodoCreate} from './types';
 import { TodoDetail } from './TodoDetail';
 
@@ -18,11 +18,26 @@ function TodosList() {
   const [selectedFile, setSelectedFile] = useState<File | null>(null);
   const [uploading, setUploading] = useState(false);
   const [filter, setFilter] = useState<'all' | 'active' | 'completed'>('all');
+  const [query, setQuery] = useState('');
+  const [searchResults, setSearchResults] = useState<Todo[] | null>(null);
 
   useEffect(() => {
     loadTodos();
   }, []);
 
+  // Wyszukiwanie po stronie serwera (indeks pełnotekstowy), z opóźnieniem na czas pisania
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(() => {
+      searchTodos(q).then(setSearchResults).catch(error => console.error('Error searching todos:', error));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [query, todos]);
+
   async function loadTodos() {
     try {
       setLoading(true);
@@ -77,7 +92,7 @@ function TodosList() {
     }
   }
 
-  const filteredTodos = todos.filter(todo => {
+  const filteredTodos = (searchResults ?? todos).filter(todo => {
     if (filter === 'active') return !todo.completed;
     if (filter === 'completed') return todo.completed;
     return true;
@@ -118,6 +133,13 @@ function TodosList() {
             <button className={`filter-btn ${filter === 'active' ? 'active' : ''}`} onClick={() => setFilter('active')}>Aktywne</button>
             <button className={`filter-btn ${filter === 'completed' ? 'active' : ''}`} onClick={() => setFilter('completed')}>Ukończone</button>
           </div>
+          <input
+            className="search-input"
+            type="search"
+            placeholder="Szukaj zadań..."
+            value={query}
+            onChange={(e) => setQuery(e.target.value)}
+          />
           <button className="add-btn" onClick={() => setShowForm(!showForm)}>
             {showForm ? '✕ Anuluj' : '+ Dodaj zadanie'}
           </button>
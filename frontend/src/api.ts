@@ -1,5 +1,5 @@
 import axios from "axios";
-import type {Todo, TodoCreate} from "./types";
+import type {Todo, TodoChanges, TodoCreate} from "./types";
 import {getApiUrl} from "./config.ts";
 import { getAccessToken } from "./auth";
 
@@ -7,12 +7,19 @@ const api = axios.create({
     baseURL: getApiUrl()
 });
 
+// Read-your-writes: po zapisie backend zwraca X-Primary-Until, a odesłany nagłówek
+// kieruje nasze odczyty na primary (zamiast repliki) do tego czasu
+let primaryUntil = "";
+
 api.interceptors.request.use(
     async config => {
         const token = await getAccessToken();
         if (token) {
             config.headers["Authorization"] = `Bearer ${token}`;
         }
+        if (primaryUntil) {
+            config.headers["X-Primary-Until"] = primaryUntil;
+        }
         return config;
     },
     error => {
@@ -20,8 +27,33 @@ api.interceptors.request.use(
     }
 );
 
+api.interceptors.response.use(res => {
+    const until = res.headers["x-primary-until"];
+    if (until) {
+        primaryUntil = until;
+    }
+    return res;
+});
+
 
 export async function uploadFile(file: File): Promise<string> {
+    // Bezpośredni upload do S3/MinIO (presigned POST); 501 = storage lokalny
+    try {
+        const presign = await api.post("/api/files/presign", {
+            filename: file.name,
+            content_type: file.type || undefined,
+            size: file.size,
+        });
+        const { key, url, fields } = presign.data;
+        const s3Form = new FormData();
+        Object.entries(fields as Record<string, string>).forEach(([name, value]) => s3Form.append(name, value));
+        s3Form.append("file", file);
+        await axios.post(url, s3Form);
+        return key as string;
+    } catch (err) {
+        if (!axios.isAxiosError(err) || err.response?.status !== 501) throw err;
+    }
+
     const form = new FormData();
     form.append("file", file);
     const res = await api.post("/api/files/", form, { headers: { "Content-Type": "multipart/form-data" } });
@@ -35,9 +67,51 @@ export async function createTodo(payload: TodoCreate): Promise<Todo> {
 }
 
 
-export async function listTodos(): Promise<Todo[]> {
+// Delta sync: po pełnym pobraniu listy kolejne odświeżenia pytają tylko o zmiany
+// od tokenu (X-Sync-Token); 410 = token nieaktualny, pobieramy listę od nowa
+let syncToken = "";
+let synced = new Map<number, Todo>();
+
+function sortedTodos(): Todo[] {
+    return [...synced.values()].sort((a, b) => b.id - a.id);
+}
+
+async function fetchAllTodos(): Promise<Todo[]> {
     console.log("Listing todos from", getApiUrl());
-    const res = await api.get("/api/todos/");
+    const todos: Todo[] = [];
+    let cursor: string | undefined;
+    let token = "";
+    do {
+        const res = await api.get("/api/todos/", { params: cursor ? { cursor } : undefined });
+        todos.push(...res.data);
+        // Token z pierwszej strony - zmiany w trakcie stronicowania przyjdą w następnym sync
+        token ||= res.headers["x-sync-token"] ?? "";
+        cursor = res.headers["x-next-cursor"];
+    } while (cursor);
+    synced = new Map(todos.map(t => [t.id, t]));
+    syncToken = token;
+    return todos;
+}
+
+export async function listTodos(): Promise<Todo[]> {
+    if (!syncToken) {
+        return fetchAllTodos();
+    }
+    try {
+        const res = await api.get<TodoChanges>("/api/todos/changes", { params: { since: syncToken } });
+        res.data.deleted.forEach(id => synced.delete(id));
+        res.data.changed.forEach(t => synced.set(t.id, t));
+        syncToken = res.data.token;
+        return sortedTodos();
+    } catch (err) {
+        if (!axios.isAxiosError(err) || err.response?.status !== 410) throw err;
+        return fetchAllTodos();
+    }
+}
+
+
+export async function searchTodos(q: string): Promise<Todo[]> {
+    const res = await api.get("/api/todos/search", { params: { q } });
     return res.data;
 }
 
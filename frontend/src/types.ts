@@ -5,6 +5,13 @@ export interface Todo {
   due_date: string | null;
   completed: boolean;
   image_key: string | null;
+  version: number;
+}
+
+export interface TodoChanges {
+  changed: Todo[];
+  deleted: number[];
+  token: string;
 }
 
 export interface TodoCreate {
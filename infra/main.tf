@@ -211,13 +211,14 @@ resource "aws_lb_target_group" "backend" {
   target_type = "ip"
   vpc_id      = data.aws_vpc.default.id
 
+  # /ready zwraca 200 dopiero po rozgrzaniu JWKS, puli DB i klienta S3
   health_check {
-    path                = "/"
+    path                = "/ready"
     healthy_threshold   = 2
     unhealthy_threshold = 5
     timeout             = 5
     interval            = 30
-    matcher             = "200-399"
+    matcher             = "200"
   }
 }
 